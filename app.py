@@ -6,97 +6,153 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+from cache import Cache
+from instrumentation import Instrumentation
+from assets import Assets
+from passwords import PasswordHasher
+from ratelimit import LoginLimiter
+from breaking import BreakingNews
+from jobs import Jobs
+from database import Database, RoutingSession, engine_options
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+# Extensions are bound to an application in create_app()
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+database = Database()
 login_manager = LoginManager()
+cache = Cache()
+instrumentation = Instrumentation()
+assets = Assets()
+passwords = PasswordHasher()
+login_limiter = LoginLimiter()
+breaking_news = BreakingNews()
+jobs = Jobs()
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///sbc_news.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# Initialize extensions
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
+login_manager.login_view = 'main.login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-# Import routes after app initialization
-from routes import *
-
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
-    
-    # Create admin user from environment variables
-    from models import User, Category, Department
-    from werkzeug.security import generate_password_hash
-    
-    admin_email = os.environ.get("ADMIN_EMAIL")
-    admin_password = os.environ.get("ADMIN_PASSWORD")
-    admin_name = os.environ.get("ADMIN_NAME", "Administrator")
-    
-    if admin_email and admin_password:
-        existing_admin = User.query.filter_by(email=admin_email).first()
-        if not existing_admin:
-            admin_user = User(
-                email=admin_email,
-                password_hash=generate_password_hash(admin_password),
-                name=admin_name,
-                role='admin',
-                role_title='Chief Editor'
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            app.logger.info(f"Admin user created: {admin_email}")
-    
-    # Add sample categories if none exist
-    if Category.query.count() == 0:
-        categories = [
-            Category(name="Politics"),
-            Category(name="Business"),
-            Category(name="Technology"),
-            Category(name="Society"),
-            Category(name="Sports"),
-            Category(name="Weather")
-        ]
-        for category in categories:
-            db.session.add(category)
-        db.session.commit()
-        app.logger.info("Sample categories created")
-    
-    # Add sample departments if none exist
-    if Department.query.count() == 0:
-        departments = [
-            Department(name="SBC News"),
-            Department(name="SBC Verify"),
-            Department(name="SBC Declassify"),
-            Department(name="SBC Investigation")
-        ]
-        for department in departments:
-            db.session.add(department)
-        db.session.commit()
-        app.logger.info("Sample departments created")
+    from queries import load_cached_user
+    return load_cached_user(int(user_id))
+
+def configure(app):
+    """Load configuration from environment variables"""
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///sbc_news.db")
+    # Read replicas for the public pages, see database.py
+    app.config["DATABASE_REPLICA_URLS"] = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+                                           if url.strip()]
+    app.config["DB_READ_YOUR_WRITES"] = int(os.environ.get("DB_READ_YOUR_WRITES", 10))
+
+    # Configure connection pooling; engine options are derived from these in create_app()
+    app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+    app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    app.config["DB_POOL_TIMEOUT"] = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 300))
+    app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "false").lower() == "true"
+    app.config["SQLITE_PRAGMAS"] = [pragma.strip() for pragma in os.environ.get(
+        "SQLITE_PRAGMAS", "journal_mode=WAL,synchronous=NORMAL,cache_size=-16000,temp_store=MEMORY").split(",")
+                                    if pragma.strip()]
+
+    # Configure the cache used for shared page data
+    app.config["CACHE_BACKEND"] = os.environ.get("CACHE_BACKEND", "memory")
+    app.config["CACHE_REDIS_URL"] = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    app.config["CACHE_DEFAULT_TTL"] = int(os.environ.get("CACHE_DEFAULT_TTL", 300))
+    app.config["CACHE_MAX_ENTRIES"] = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+    app.config["SITE_CHROME_TTL"] = int(os.environ.get("SITE_CHROME_TTL", 60))
+    app.config["PAGE_CACHE_ENABLED"] = os.environ.get("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    app.config["PAGE_CACHE_TTL"] = int(os.environ.get("PAGE_CACHE_TTL", 300))
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+
+    # Configure opt-in performance instrumentation
+    app.config["PERF_INSTRUMENTATION"] = os.environ.get("PERF_INSTRUMENTATION", "false").lower() == "true"
+    app.config["PERF_QUERY_BUDGET"] = int(os.environ.get("PERF_QUERY_BUDGET", 20))
+    app.config["PERF_SAMPLE_SIZE"] = int(os.environ.get("PERF_SAMPLE_SIZE", 1024))
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+
+    # Configure the pre-rendered export of public pages (off unless a directory is set)
+    app.config["STATIC_EXPORT_DIR"] = os.environ.get("STATIC_EXPORT_DIR")
+
+    # Configure password hashing, done in a bounded pool of worker processes
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.environ.get("PASSWORD_HASH_QUEUE", 8))
+    app.config["PASSWORD_HASH_TIMEOUT"] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 5))
+
+    # Configure login attempt limits per client IP and per account
+    app.config["LOGIN_IP_LIMIT"] = int(os.environ.get("LOGIN_IP_LIMIT", 20))
+    app.config["LOGIN_ACCOUNT_LIMIT"] = int(os.environ.get("LOGIN_ACCOUNT_LIMIT", 5))
+    app.config["LOGIN_RATE_WINDOW"] = int(os.environ.get("LOGIN_RATE_WINDOW", 300))
+
+    # Configure the live breaking news stream (connections are held only under gevent unless set)
+    app.config["BREAKING_POLL_INTERVAL"] = int(os.environ.get("BREAKING_POLL_INTERVAL", 5))
+    app.config["BREAKING_RETRY"] = int(os.environ.get("BREAKING_RETRY", 30))
+    hold = os.environ.get("BREAKING_STREAM_HOLD")
+    app.config["BREAKING_STREAM_HOLD"] = int(hold) if hold else None
+
+    # Configure the background job queue (thread, queue or eager; see jobs.py)
+    app.config["JOBS_MODE"] = os.environ.get("JOBS_MODE", "thread")
+    app.config["JOBS_POLL_INTERVAL"] = float(os.environ.get("JOBS_POLL_INTERVAL", 2))
+    app.config["JOBS_RETRY_DELAY"] = int(os.environ.get("JOBS_RETRY_DELAY", 10))
+    app.config["JOBS_TIMEOUT"] = int(os.environ.get("JOBS_TIMEOUT", 300))
+
+    # Configure streamed rendering of the long public pages (see streaming.py)
+    app.config["STREAM_TEMPLATES"] = os.environ.get("STREAM_TEMPLATES", "false").lower() == "true"
+    app.config["STREAM_CHUNK_SIZE"] = int(os.environ.get("STREAM_CHUNK_SIZE", 16384))
+
+    # Configure where images extracted from article bodies are written and served from
+    app.config["MEDIA_DIR"] = os.environ.get("MEDIA_DIR", os.path.join(app.static_folder, "media"))
+    app.config["MEDIA_URL"] = os.environ.get("MEDIA_URL", "/static/media")
+
+    # Configure where `flask assets build` writes fingerprinted static files
+    app.config["ASSETS_DIST"] = os.environ.get("ASSETS_DIST", os.path.join(app.static_folder, "dist"))
+
+def create_app(config=None):
+    """Application factory
+
+    Building an application only reads configuration and registers extensions,
+    routes and CLI commands; it never touches the database. Schema creation,
+    migrations and seed data are done by `flask bootstrap`.
+
+    Extensions keep their per-application state in app.extensions, so tests
+    and benchmarks can build several applications in one process.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    # Set up logging
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "DEBUG").upper())
+
+    app = Flask(__name__)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+    configure(app)
+    if config:
+        app.config.update(config)
+
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+
+    # Initialize extensions
+    db.init_app(app)
+    database.init_app(app)
+    login_manager.init_app(app)
+    cache.init_app(app)
+    instrumentation.init_app(app)
+    assets.init_app(app)
+    passwords.init_app(app)
+    login_limiter.init_app(app)
+    breaking_news.init_app(app)
+    jobs.init_app(app)
+
+    # Register routes and CLI commands
+    from routes import bp
+    import commands
+    app.register_blueprint(bp)
+    commands.init_app(app)
+
+    return app
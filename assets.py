@@ -0,0 +1,241 @@
+"""Fingerprinted, precompressed static assets
+
+`flask assets build` minifies the stylesheets and scripts under static/,
+writes each one to static/dist/ with a hash of its contents in the file name,
+next to gzip and brotli variants, and records the mapping in static/dist/manifest.json.
+
+Templates link assets through asset_url('css/style.css'). With a manifest,
+that points at /assets/<hashed name>. A file name changes whenever its
+content does, so these responses are cacheable forever (`immutable`) and
+browsers stop asking for them on repeat views. The precompressed variant is
+picked from Accept-Encoding. Without a build, asset_url() falls back to the
+plain /static/ URL, so development needs no build step.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from flask import current_app, request, send_from_directory, url_for, abort
+
+SOURCES = ('css/style.css', 'js/main.js')
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+# Hashed file names never change content, so caches may keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Strings are copied through untouched and comments dropped; everything else is compacted
+CSS_STRING_OR_COMMENT = re.compile(r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*.*?\*/''', re.DOTALL)
+CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+JS_WORDS_BEFORE_REGEX = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                         'throw', 'case', 'do', 'else', 'yield', 'await'}
+JS_PUNCTUATION = set('{}()[];,:=<>!&|?')
+
+def minify_css(source):
+    """Drop comments and redundant whitespace from a stylesheet, leaving strings alone"""
+    parts, code, last = [], [], 0
+    for match in CSS_STRING_OR_COMMENT.finditer(source):
+        code.append(source[last:match.start()])
+        if not match.group().startswith('/*'):
+            parts.append(compact_css(''.join(code)))
+            parts.append(match.group())
+            code = []
+        last = match.end()
+    code.append(source[last:])
+    parts.append(compact_css(''.join(code)))
+    return ''.join(parts).strip()
+
+def compact_css(code):
+    code = ' '.join(code.split())
+    code = CSS_PUNCTUATION.sub(r'\1', code)
+    # Spaces after a colon are never significant, unlike those before one (`a :hover`)
+    code = re.sub(r':\s+', ':', code)
+    return code.replace(';}', '}')
+
+def minify_js(source):
+    """Drop comments and indentation from a script
+
+    Conservative on purpose: strings, template literals and regular expression
+    literals are copied verbatim, and line breaks are kept so automatic
+    semicolon insertion sees the same statements.
+    """
+    out = []
+    i, length = 0, len(source)
+
+    def previous_significant():
+        for chunk in reversed(out):
+            stripped = chunk.rstrip()
+            if stripped:
+                return stripped
+        return ''
+
+    while i < length:
+        char = source[i]
+        if char in '"\'`':
+            end = i + 1
+            while end < length and source[end] != char:
+                end += 2 if source[end] == '\\' else 1
+            out.append(source[i:end + 1])
+            i = end + 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        elif char == '/' and starts_regex(previous_significant()):
+            end, in_class = i + 1, False
+            while end < length and (in_class or source[end] != '/') and source[end] != '\n':
+                if source[end] == '\\':
+                    end += 1
+                elif source[end] == '[':
+                    in_class = True
+                elif source[end] == ']':
+                    in_class = False
+                end += 1
+            out.append(source[i:end + 1])
+            i = end + 1
+        elif char.isspace():
+            end = i
+            while end < length and source[end].isspace():
+                end += 1
+            whitespace = source[i:end]
+            before = out[-1][-1:] if out and out[-1] else ''
+            after = source[end:end + 1]
+            if '\n' in whitespace:
+                if before and before != '\n':
+                    out.append('\n')
+            elif before and before != '\n' and after and before not in JS_PUNCTUATION \
+                    and after not in JS_PUNCTUATION:
+                out.append(' ')
+            i = end
+        else:
+            end = i + 1
+            while end < length and not source[end].isspace() and source[end] not in '"\'`/':
+                end += 1
+            out.append(source[i:end])
+            i = end
+
+    return ''.join(out).strip() + '\n'
+
+def starts_regex(previous):
+    """Whether a '/' following this text opens a regular expression rather than dividing"""
+    if not previous:
+        return True
+    # A postfix increment or decrement ends an operand; a prefix one cannot come before a regex
+    if previous.endswith(('++', '--')):
+        return False
+    if previous[-1] in '(,=:[!&|?{};+-*%<>~^':
+        return True
+    word = re.search(r'[A-Za-z_$][\w$]*$', previous)
+    return bool(word) and word.group() in JS_WORDS_BEFORE_REGEX
+
+def minify(name, source):
+    """Minified source, using rcssmin/rjsmin when installed and the built-in minifiers otherwise"""
+    if name.endswith('.css'):
+        try:
+            import rcssmin
+            return rcssmin.cssmin(source)
+        except ImportError:
+            return minify_css(source)
+    if name.endswith('.js'):
+        try:
+            import rjsmin
+            return rjsmin.jsmin(source)
+        except ImportError:
+            return minify_js(source)
+    return source
+
+def hashed_name(name, content):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+def compress(path, content):
+    """Write the gzip and brotli variants of a file"""
+    # Imported here so serving the built files does not need the package
+    import brotli
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 keeps the output identical between builds of the same content
+        with gzip.GzipFile(filename='', mode='wb', fileobj=f, compresslevel=9, mtime=0) as gz:
+            gz.write(content)
+    with open(path + '.br', 'wb') as f:
+        f.write(brotli.compress(content, quality=11))
+
+def build(static_folder, dist_folder, sources=SOURCES):
+    """Write minified, hashed and compressed copies of the sources and their manifest
+
+    Files from earlier builds are left in place so pages rendered before a
+    deploy can still load the assets they reference.
+    """
+    manifest, report = {}, []
+    for name in sources:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            source = f.read()
+        content = minify(name, source).encode('utf-8')
+        target = hashed_name(name, content)
+        path = os.path.join(dist_folder, target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        compress(path, content)
+        manifest[name] = target
+        report.append((name, target, len(source.encode('utf-8')), len(content),
+                       os.path.getsize(path + '.gz'), os.path.getsize(path + '.br')))
+
+    # Written last, and atomically, so a running server never sees a manifest ahead of its files
+    tmp = os.path.join(dist_folder, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_folder, MANIFEST))
+    return report
+
+class Assets:
+    """Flask extension resolving asset names through the build manifest and serving the built files"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # The manifest of each application, read on first use
+        app.extensions['assets'] = {'manifest': None}
+        app.config.setdefault('ASSETS_DIST', os.path.join(app.static_folder, 'dist'))
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def load_manifest(self):
+        path = os.path.join(current_app.config['ASSETS_DIST'], MANIFEST)
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def url(self, name):
+        """URL of a static asset: its fingerprinted build if there is one, the plain file otherwise"""
+        state = current_app.extensions['assets']
+        if state['manifest'] is None:
+            state['manifest'] = self.load_manifest()
+        built = state['manifest'].get(name)
+        if built is None:
+            return url_for('static', filename=name)
+        return url_for('assets', filename=built)
+
+    def serve(self, filename):
+        """A built asset, precompressed to match Accept-Encoding, cacheable forever"""
+        dist = current_app.config['ASSETS_DIST']
+        if filename.endswith(('.gz', '.br')) or filename == MANIFEST:
+            abort(404)
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.isfile(os.path.join(dist, filename + suffix)):
+                response = send_from_directory(dist, filename + suffix, mimetype=mimetypes.guess_type(filename)[0],
+                                               max_age=31536000)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(dist, filename, max_age=31536000)
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
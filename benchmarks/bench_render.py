@@ -0,0 +1,130 @@
+"""Benchmark of buffered against streamed page rendering
+
+    python -m benchmarks.bench_render --requests 50
+    python -m benchmarks.bench_render --body-kb 800 --routes article
+
+Renders a long article and the busiest category page through the test client,
+once with render_template() building the whole page (STREAM_TEMPLATES off)
+and once streamed (on). For each it reports time to first byte (the first
+chunk the WSGI iterable yields), time to the last byte and the peak Python
+memory allocated while serving one request, measured with tracemalloc in
+separate runs so the tracing overhead does not distort the timings. The page
+cache is off, so every request renders.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+LONG_TITLE = 'Benchmark long read'
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default=os.path.join(RESULTS_DIR, 'render.db'), help='SQLite database file')
+    parser.add_argument('--articles', type=int, default=2000, help='Articles generated into a new database')
+    parser.add_argument('--body-kb', type=int, default=400, help='Size of the long article body')
+    parser.add_argument('--requests', type=int, default=30, help='Measured requests per route and mode')
+    parser.add_argument('--routes', default='article,category', help='Comma-separated subset of article,category')
+    return parser.parse_args(argv)
+
+def load_app(args):
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    fresh = not os.path.exists(args.db)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    os.environ['PAGE_CACHE_ENABLED'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+
+    from app import create_app
+    from bootstrap import bootstrap
+    app = create_app({'JOBS_MODE': 'eager'})
+    with app.app_context():
+        bootstrap()
+        if fresh:
+            import datagen
+            datagen.generate(articles=args.articles, echo=lambda line: print(f'  {line}', end='\r'))
+            print()
+    return app
+
+def long_article(app, body_kb):
+    """Id of a published article with a body of about body_kb kilobytes, created if needed"""
+    from app import db
+    from models import Article, User, Category
+    from utils import make_excerpt
+    with app.app_context():
+        paragraph = '<p>' + 'An investigative paragraph with <em>emphasis</em> and a <a href="#">link</a>. ' * 12 + '</p>\n'
+        content = paragraph * max(1, body_kb * 1024 // len(paragraph))
+        article = Article.query.filter_by(title=LONG_TITLE).first()
+        if article is None:
+            article = Article(title=LONG_TITLE, published=True, author_id=User.query.first().id,
+                              category_id=Category.query.first().id)
+            db.session.add(article)
+        if article.content != content:
+            article.content, article.excerpt = content, make_excerpt(content)
+        db.session.commit()
+        return article.id, len(content)
+
+def busiest_category(app):
+    from sqlalchemy import func
+    from app import db
+    from models import Article
+    with app.app_context():
+        return db.session.query(Article.category_id).filter(Article.published.is_(True)) \
+            .group_by(Article.category_id).order_by(func.count(Article.id).desc()).first()[0]
+
+def serve(client, path):
+    """Time to first and last byte of one request, and its size"""
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter()
+        size += len(chunk)
+    last = time.perf_counter()
+    response.close()
+    assert response.status_code == 200, response.status_code
+    return first - started, last - started, size
+
+def peak_memory(client, path):
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    serve(client, path)
+    return tracemalloc.get_traced_memory()[1] - baseline
+
+def measure(app, path, streamed, requests):
+    app.config['STREAM_TEMPLATES'] = streamed
+    client = app.test_client()
+    for _ in range(3):
+        serve(client, path)
+    timings = [serve(client, path) for _ in range(requests)]
+    tracemalloc.start()
+    peaks = [peak_memory(client, path) for _ in range(max(3, requests // 5))]
+    tracemalloc.stop()
+    return {
+        'ttfb_ms': statistics.median(t[0] for t in timings) * 1000,
+        'total_ms': statistics.median(t[1] for t in timings) * 1000,
+        'bytes': timings[0][2],
+        'peak_kb': statistics.median(peaks) / 1024,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = load_app(args)
+    article_id, body_size = long_article(app, args.body_kb)
+    paths = {'article': f'/article/{article_id}', 'category': f'/category/{busiest_category(app)}'}
+    print(f"long article body {body_size / 1024:.0f} KB, {args.requests} requests per route and mode")
+    print(f"{'route':10} {'mode':9} {'TTFB ms':>9} {'total ms':>9} {'page KB':>8} {'peak KB':>9}")
+    for name in args.routes.split(','):
+        for streamed in (False, True):
+            result = measure(app, paths[name], streamed, args.requests)
+            print(f"{name:10} {'streamed' if streamed else 'buffered':9} {result['ttfb_ms']:9.2f} "
+                  f"{result['total_ms']:9.2f} {result['bytes'] / 1024:8.0f} {result['peak_kb']:9.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Benchmark of the public and editorial routes
+
+    python -m benchmarks.bench_routes --articles 20000 --requests 200
+    python -m benchmarks.bench_routes --compare benchmarks/results/<earlier run>.json
+
+Builds a SQLite database with datagen (or reuses the one given with --db),
+then drives index, category, article, dashboard, create_article and
+edit_article through the Flask test client and through a threaded local WSGI
+server. For every route it reports throughput, latency percentiles and SQL
+statements per request, the latter read from the Server-Timing header that
+instrumentation.py adds. Results are written as JSON so runs can be compared.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+QUERY_COUNT = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db', default=os.path.join(RESULTS_DIR, 'bench.db'), help='SQLite database file')
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild the database even if it exists')
+    parser.add_argument('--articles', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--categories', type=int, default=6)
+    parser.add_argument('--departments', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route and mode')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route and mode')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client threads against the WSGI server')
+    parser.add_argument('--mode', choices=('testclient', 'wsgi', 'both'), default='both')
+    parser.add_argument('--routes', help='Comma-separated subset of routes to run')
+    parser.add_argument('--page-cache', action='store_true', help='Leave the anonymous page cache on')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    return parser.parse_args(argv)
+
+def load_app(args):
+    """Build the application configured for benchmarking against the benchmark database"""
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    if args.regenerate and os.path.exists(args.db):
+        os.remove(args.db)
+    fresh = not os.path.exists(args.db)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+    os.environ['PERF_INSTRUMENTATION'] = 'true'
+    os.environ['PERF_QUERY_BUDGET'] = '100000'
+    os.environ['PAGE_CACHE_ENABLED'] = 'true' if args.page_cache else 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+
+    from app import create_app
+    from bootstrap import bootstrap
+    app = create_app({'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        bootstrap()
+    if fresh:
+        import datagen
+        with app.app_context():
+            datagen.generate(users=args.users, categories=args.categories, departments=args.departments,
+                             articles=args.articles, echo=lambda line: print(f'  {line}', end='\r'))
+        print()
+    return app
+
+class Route:
+    def __init__(self, name, method, path, data=None, authenticated=False):
+        self.name, self.method, self.path, self.data, self.authenticated = name, method, path, data, authenticated
+
+def build_routes(app):
+    """The benchmarked requests, pointed at representative rows of the dataset"""
+    from sqlalchemy import func
+    from app import db
+    from models import User, Article
+
+    with app.app_context():
+        admin_id = db.session.query(func.min(User.id)).filter(User.role == 'admin').scalar()
+        category_id, = db.session.query(Article.category_id).filter(Article.published.is_(True)) \
+            .group_by(Article.category_id).order_by(func.count(Article.id).desc()).first()
+        article = Article.query.filter(Article.published.is_(True)).order_by(Article.created_at.desc()).first()
+        article_id, edit_id = article.id, article.id
+        article_count = Article.query.count()
+
+    form = {'title': 'Benchmark article title', 'content': '<p>' + 'Benchmark body text. ' * 200 + '</p>',
+            'summary': '', 'category_id': category_id, 'department_id': 0}
+    return [
+        Route('index', 'GET', '/'),
+        Route('category', 'GET', f'/category/{category_id}'),
+        Route('article', 'GET', f'/article/{article_id}'),
+        Route('dashboard', 'GET', '/dashboard', authenticated=True),
+        Route('create_article', 'POST', '/dashboard/create-article', form, authenticated=True),
+        Route('edit_article', 'POST', f'/dashboard/edit-article/{edit_id}', dict(form, published='y'),
+              authenticated=True),
+    ], admin_id, article_count
+
+def session_cookie(app, user_id):
+    """Signed Flask session cookie value logging in the given user"""
+    return app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+
+def summarize(latencies, queries, statuses, wall_time):
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    def pct(q):
+        return latencies_ms[max(0, int(round(q * len(latencies_ms))) - 1)]
+    return {
+        'requests': len(latencies_ms),
+        'throughput_rps': round(len(latencies_ms) / wall_time, 1),
+        'mean_ms': round(statistics.fmean(latencies_ms), 2),
+        'p50_ms': round(pct(0.50), 2),
+        'p95_ms': round(pct(0.95), 2),
+        'p99_ms': round(pct(0.99), 2),
+        'max_ms': round(latencies_ms[-1], 2),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'statuses': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+def query_count(server_timing):
+    match = QUERY_COUNT.search(server_timing or '')
+    return int(match.group(1)) if match else None
+
+def run_test_client(app, route, cookie, args):
+    client = app.test_client()
+    if route.authenticated:
+        client.set_cookie(app.config['SESSION_COOKIE_NAME'], cookie)
+    latencies, queries, statuses = [], [], []
+    started = None
+    for i in range(args.warmup + args.requests):
+        if i == args.warmup:
+            started = time.perf_counter()
+        t0 = time.perf_counter()
+        response = client.open(route.path, method=route.method, data=route.data)
+        elapsed = time.perf_counter() - t0
+        if i >= args.warmup:
+            latencies.append(elapsed)
+            statuses.append(response.status_code)
+            count = query_count(response.headers.get('Server-Timing'))
+            if count is not None:
+                queries.append(count)
+    return summarize(latencies, queries, statuses, time.perf_counter() - started)
+
+def http_request(port, route, cookie_header):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Cookie': cookie_header} if cookie_header else {}
+    body = None
+    if route.data is not None:
+        body = urlencode(route.data)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    t0 = time.perf_counter()
+    connection.request(route.method, route.path, body=body, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    elapsed = time.perf_counter() - t0
+    connection.close()
+    return elapsed, response.status, query_count(response.getheader('Server-Timing'))
+
+def run_wsgi(app, route, cookie, port, args):
+    cookie_header = f"{app.config['SESSION_COOKIE_NAME']}={cookie}" if route.authenticated else None
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lambda _: http_request(port, route, cookie_header), range(args.warmup)))
+        started = time.perf_counter()
+        results = list(pool.map(lambda _: http_request(port, route, cookie_header), range(args.requests)))
+        wall_time = time.perf_counter() - started
+    return summarize([r[0] for r in results], [r[2] for r in results if r[2] is not None],
+                     [r[1] for r in results], wall_time)
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_table(mode, results):
+    print(f"\n{mode}")
+    print(f"{'route':16} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}  statuses")
+    for name, r in results.items():
+        queries = '-' if r['queries_per_request'] is None else f"{r['queries_per_request']:g}"
+        print(f"{name:16} {r['throughput_rps']:9.1f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+              f"{queries:>8}  {r['statuses']}")
+
+def print_comparison(previous, current):
+    print(f"\nCompared with {previous['meta'].get('revision')} ({previous['meta'].get('timestamp')})")
+    for mode, results in current['results'].items():
+        for name, r in results.items():
+            old = previous['results'].get(mode, {}).get(name)
+            if not old:
+                continue
+            def delta(key):
+                return (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"{mode:10} {name:16} req/s {delta('throughput_rps'):+7.1f}%  p50 {delta('p50_ms'):+7.1f}%  "
+                  f"p95 {delta('p95_ms'):+7.1f}%  queries {old['queries_per_request']} -> {r['queries_per_request']}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = load_app(args)
+    routes, admin_id, article_count = build_routes(app)
+    if args.routes:
+        wanted = set(args.routes.split(','))
+        routes = [route for route in routes if route.name in wanted]
+    cookie = session_cookie(app, admin_id)
+
+    modes = ('testclient', 'wsgi') if args.mode == 'both' else (args.mode,)
+    results = {}
+    server = start_server(app) if 'wsgi' in modes else None
+    for mode in modes:
+        results[mode] = {}
+        for route in routes:
+            if mode == 'testclient':
+                results[mode][route.name] = run_test_client(app, route, cookie, args)
+            else:
+                results[mode][route.name] = run_wsgi(app, route, cookie, server.server_port, args)
+        print_table(mode, results[mode])
+    if server:
+        server.shutdown()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': os.path.abspath(args.db),
+            'articles': article_count,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'page_cache': args.page_cache,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
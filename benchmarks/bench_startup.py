@@ -0,0 +1,90 @@
+"""Benchmark of worker cold start
+
+    python -m benchmarks.bench_startup --runs 20
+    python -m benchmarks.bench_startup --root /path/to/other/checkout
+
+Each run starts a fresh interpreter, the way a gunicorn worker boots, and
+times `import main` (building the application) and then the first and second
+requests to the homepage through the test client. The database is set up once
+beforehand with `flask bootstrap` from this checkout, so every run finds the
+schema and seed data in place. --root runs the same measurement against another
+checkout of the site, e.g. a git worktree of an earlier revision.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Runs inside the fresh interpreter; prints one JSON line of timings in seconds
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from main import app
+imported = time.perf_counter()
+modules = len(sys.modules)
+client = app.test_client()
+status = client.get('/').status_code
+first = time.perf_counter()
+client.get('/')
+second = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_request': first - imported,
+                  'second_request': second - first, 'modules': modules, 'status': status}))
+"""
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--root', default=ROOT, help='Checkout whose main.py is measured')
+    parser.add_argument('--db', default=os.path.join(RESULTS_DIR, 'startup.db'), help='SQLite database file')
+    parser.add_argument('--articles', type=int, default=1000, help='Articles generated into a new database')
+    parser.add_argument('--runs', type=int, default=10)
+    return parser.parse_args(argv)
+
+def environment(args):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f'sqlite:///{os.path.abspath(args.db)}',
+        'ADMIN_EMAIL': 'admin@sbc.example',
+        'ADMIN_PASSWORD': 'benchmark-password',
+        'LOG_LEVEL': 'WARNING',
+        'PAGE_CACHE_ENABLED': 'false',
+    })
+    return env
+
+def prepare_database(args, env):
+    """Bootstrap the benchmark database with this checkout, generating data into a new one"""
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    fresh = not os.path.exists(args.db)
+    flask = [sys.executable, '-m', 'flask', '--app', 'main']
+    subprocess.run(flask + ['bootstrap'], cwd=ROOT, env=env, check=True, capture_output=True)
+    if fresh and args.articles:
+        subprocess.run(flask + ['generate-data', '--articles', str(args.articles)],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+
+def probe(root, env):
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=root, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = environment(args)
+    prepare_database(args, env)
+
+    # One unmeasured run warms the OS file cache and writes bytecode
+    probe(args.root, env)
+    runs = [probe(args.root, env) for _ in range(args.runs)]
+
+    print(f"{os.path.abspath(args.root)}, {args.runs} runs, status {runs[0]['status']}, "
+          f"{runs[0]['modules']} modules loaded")
+    print(f"{'phase':16} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for phase in ('import', 'first_request', 'second_request'):
+        values = [run[phase] * 1000 for run in runs]
+        print(f"{phase:16} {statistics.median(values):10.1f} {min(values):10.1f} {max(values):10.1f}")
+
+if __name__ == '__main__':
+    main()
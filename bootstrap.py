@@ -0,0 +1,49 @@
+"""One-off database setup: schema, migrations and seed data
+
+Run with `flask bootstrap` on deploy, once, rather than in every worker.
+"""
+import os
+from flask import current_app
+from app import db, passwords
+from models import User, Category, Department
+import migrations
+
+SAMPLE_CATEGORIES = ["Politics", "Business", "Technology", "Society", "Sports", "Weather"]
+SAMPLE_DEPARTMENTS = ["SBC News", "SBC Verify", "SBC Declassify", "SBC Investigation"]
+
+def bootstrap():
+    """Create missing tables, apply migrations and seed the admin user, categories and departments"""
+    logger = current_app.logger
+    db.create_all()
+    migrations.upgrade(logger=logger)
+
+    # Create admin user from environment variables
+    admin_email = os.environ.get("ADMIN_EMAIL")
+    admin_password = os.environ.get("ADMIN_PASSWORD")
+    admin_name = os.environ.get("ADMIN_NAME", "Administrator")
+
+    if admin_email and admin_password:
+        existing_admin = User.query.filter_by(email=admin_email).first()
+        if not existing_admin:
+            admin_user = User(
+                email=admin_email,
+                password_hash=passwords.hash(admin_password),
+                name=admin_name,
+                role='admin',
+                role_title='Chief Editor'
+            )
+            db.session.add(admin_user)
+            db.session.commit()
+            logger.info(f"Admin user created: {admin_email}")
+
+    # Add sample categories if none exist
+    if not db.session.query(Category.query.exists()).scalar():
+        db.session.add_all([Category(name=name) for name in SAMPLE_CATEGORIES])
+        db.session.commit()
+        logger.info("Sample categories created")
+
+    # Add sample departments if none exist
+    if not db.session.query(Department.query.exists()).scalar():
+        db.session.add_all([Department(name=name) for name in SAMPLE_DEPARTMENTS])
+        db.session.commit()
+        logger.info("Sample departments created")
@@ -0,0 +1,152 @@
+"""Live breaking news banner over Server-Sent Events
+
+Pages subscribe to /breaking/stream and static/js/main.js swaps the banner
+in place whenever a new event arrives, so readers see a new or cleared
+breaking story without reloading.
+
+Each worker process keeps the current banner in a BreakingNews hub. The
+write routes publish to their own worker right away. A watcher thread
+re-reads the banner every BREAKING_POLL_INTERVAL seconds, so other workers
+catch up within that interval, and the database sees one small query per
+worker however many readers are connected.
+
+How long a connection is held depends on the server. Under gevent workers,
+the default in gunicorn.conf.py, an idle stream is a parked greenlet, so
+connections are held for BREAKING_STREAM_HOLD seconds (300 by default) with
+keep-alive comments in between. Sync and thread workers cannot afford that,
+and polling them would cost every open tab a request per BREAKING_RETRY
+seconds, so there pages render without the stream URL, do not subscribe, and
+show the banner as of their last load. A client that does connect gets the
+current banner and the connection closes.
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from flask import current_app, url_for
+
+KEEP_ALIVE = 15
+
+def greenlet_server():
+    """Whether sockets are cooperative, as under gunicorn's gevent workers"""
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey) and monkey.is_module_patched('socket')
+
+def current_banner():
+    """The breaking news banner as an event payload, None when there is none"""
+    from queries import breaking_news_query
+    breaking = breaking_news_query().first()
+    if breaking is None:
+        return None
+    return {
+        'id': breaking.id,
+        'text': breaking.breaking_message or breaking.title,
+        'url': url_for('main.article', article_id=breaking.id),
+    }
+
+def format_event(event_id, data):
+    return f"id: {event_id}\nevent: breaking\ndata: {data}\n\n"
+
+class BannerHub:
+    """Current banner of one application in this process, and the streams waiting on it
+
+    Kept in app.extensions['breaking_news'].
+    """
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config.get('BREAKING_POLL_INTERVAL', 5)
+        self.retry = app.config.get('BREAKING_RETRY', 30)
+        self.hold = app.config.get('BREAKING_STREAM_HOLD')
+        self.event = None
+        self._condition = threading.Condition()
+        self._watcher = None
+
+    def publish(self, banner):
+        data = json.dumps(banner, separators=(',', ':'))
+        event_id = hashlib.sha1(data.encode()).hexdigest()[:12]
+        with self._condition:
+            if self.event and self.event[0] == event_id:
+                return False
+            self.event = (event_id, data)
+            self._condition.notify_all()
+        return True
+
+    def watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                # A request context so url_for() works; its teardown returns the database session
+                with self.app.test_request_context():
+                    self.publish(current_banner())
+            except Exception:
+                self.app.logger.exception("Could not refresh the breaking news banner")
+
+    def start(self):
+        if self._watcher is None:
+            self.publish(current_banner())
+            with self._condition:
+                if self._watcher is None:
+                    self._watcher = threading.Thread(target=self.watch, name='breaking-news', daemon=True)
+                    self._watcher.start()
+
+    def hold_seconds(self):
+        if self.hold is not None:
+            return self.hold
+        return 300 if greenlet_server() else 0
+
+    def stream(self, last_event_id=None):
+        hold = self.hold_seconds()
+        # Held streams reconnect right after the server closes them; short ones after BREAKING_RETRY
+        yield f"retry: {3000 if hold else self.retry * 1000}\n\n"
+        seen = last_event_id
+        deadline = time.monotonic() + hold
+        while True:
+            event = self.event
+            if event[0] != seen:
+                seen = event[0]
+                yield format_event(*event)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            with self._condition:
+                changed = self._condition.wait_for(lambda: self.event[0] != seen, min(KEEP_ALIVE, remaining))
+            if not changed:
+                yield ": keep-alive\n\n"
+
+class BreakingNews:
+    """Flask extension holding the current banner of this process and notifying its streams"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['breaking_news'] = BannerHub(app)
+
+    @property
+    def hub(self):
+        return current_app.extensions['breaking_news']
+
+    def live(self):
+        """Whether this process holds streams open, so pages should subscribe to them"""
+        return self.hub.hold_seconds() > 0
+
+    def publish(self, banner):
+        """Make a banner current and wake every stream of this process; returns False if unchanged"""
+        return self.hub.publish(banner)
+
+    def refresh(self):
+        """Publish the banner as stored in the database; needs an application context"""
+        return self.publish(current_banner())
+
+    def start(self):
+        """Load the banner and start this process's watcher, once; needs an application context"""
+        self.hub.start()
+
+    def stream(self, last_event_id=None):
+        """Event stream for one reader, after start()
+
+        The generator runs outside the request context, so an open stream
+        holds no database session.
+        """
+        return self.hub.stream(last_event_id)
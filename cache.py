@@ -0,0 +1,135 @@
+"""Process-wide cache with pluggable backends
+
+`memory` keeps entries in an in-process LRU with a per-entry TTL. Each worker
+has its own copy, so entries written or invalidated in one worker are only
+seen by the others once their TTL runs out. `redis` shares entries between
+workers through any Redis-compatible server and needs the optional `redis`
+package. Values must be picklable.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry"""
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._entries.get(key, (0, None))
+            self._entries[key] = (value + 1, expires_at)
+            self._entries.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """Shared backend for Redis and Redis-compatible servers"""
+    def __init__(self, url, default_ttl=300, prefix='sbc:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+class Cache:
+    """Flask extension exposing the cache backend configured for the current application
+
+    The backend lives in app.extensions['cache'], so applications built in
+    one process each keep their own.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if backend == 'memory':
+            app.extensions['cache'] = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1024), default_ttl)
+        elif backend == 'redis':
+            app.extensions['cache'] = RedisBackend(app.config['CACHE_REDIS_URL'], default_ttl)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+    @property
+    def backend(self):
+        return current_app.extensions['cache']
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def incr(self, key):
+        return self.backend.incr(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
@@ -0,0 +1,258 @@
+import click
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from app import db, jobs
+from sqlalchemy.orm import load_only
+from models import Article
+import migrations
+import queries
+import search
+import datagen
+import bootstrap
+import bulk
+import assets
+import static_export
+import page_cache
+import sanitize
+from utils import make_excerpt
+
+db_cli = AppGroup('db', help='Database schema commands')
+
+@click.command('bootstrap')
+@with_appcontext
+def bootstrap_command():
+    """Create the schema, apply migrations and seed the admin user, categories and departments"""
+    bootstrap.bootstrap()
+    click.echo("Database ready")
+
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Apply pending schema migrations"""
+    db.create_all()
+    applied = migrations.upgrade(logger=current_app.logger)
+    click.echo(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+
+@db_cli.command('status')
+def db_status():
+    """List migrations and whether they have been applied"""
+    migrations.schema_version.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        done = migrations.applied_versions(conn)
+    for version, description, _ in sorted(migrations.MIGRATIONS, key=lambda m: m[0]):
+        click.echo(f"{'[x]' if version in done else '[ ]'} {version:4d}  {description}")
+
+def route_queries():
+    """The statements behind each public and dashboard route, keyed by a readable name"""
+    deep_cursor = f"{datetime(2000, 1, 1).strftime(queries.CURSOR_FORMAT)}-1"
+    return {
+        'index': queries.keyset_query(queries.published_articles())[0],
+        'index (deep page)': queries.keyset_query(queries.published_articles(), after=deep_cursor)[0],
+        'category': queries.keyset_query(queries.category_articles(1))[0],
+        'category (deep page)': queries.keyset_query(queries.category_articles(1), after=deep_cursor)[0],
+        'article': queries.with_relations().filter_by(id=1).limit(1),
+        'breaking news': queries.breaking_news_query().limit(1),
+        'category counts': db.session.query(Article.category_id, db.func.count(Article.id))
+            .filter(Article.published.is_(True)).group_by(Article.category_id),
+        'dashboard (admin)': queries.keyset_query(queries.dashboard_articles(), per_page=10)[0],
+        'dashboard (author)': queries.keyset_query(queries.dashboard_articles(author_id=1), per_page=10)[0],
+        'counts per author': queries.article_counts_query(Article.author_id),
+        'counts per category': queries.article_counts_query(Article.category_id),
+        'counts per department': queries.article_counts_query(Article.department_id),
+    }
+
+def explain(conn, statement):
+    """Rows of the database's query plan for a SQLAlchemy statement"""
+    compiled = statement.compile(dialect=conn.dialect)
+    if conn.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+    return [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + str(compiled), compiled.params)]
+
+def is_table_scan(line):
+    """Whether a plan line reads the article table without an index"""
+    return ('SCAN article' in line and 'USING' not in line) or 'Seq Scan on article' in line
+
+@db_cli.command('explain')
+def db_explain():
+    """Print the query plan of every route query and flag table scans"""
+    scans = 0
+    with db.engine.connect() as conn:
+        for name, query in route_queries().items():
+            click.echo(f"== {name}")
+            for line in explain(conn, query.statement):
+                flagged = is_table_scan(line)
+                scans += flagged
+                click.echo(f"   {line}{'   <-- TABLE SCAN' if flagged else ''}")
+    click.echo(f"{scans} table scan(s) on article")
+
+articles_cli = AppGroup('articles', help='Article maintenance commands')
+assets_cli = AppGroup('assets', help='Static asset commands')
+jobs_cli = AppGroup('jobs', help='Background job queue commands')
+
+@articles_cli.command('backfill-excerpts')
+@click.option('--batch-size', default=500, show_default=True, help='Articles updated per transaction')
+@click.option('--all', 'recompute_all', is_flag=True, help='Recompute excerpts that are already set')
+def backfill_excerpts(batch_size, recompute_all):
+    """Compute plain-text excerpts for existing articles"""
+    last_id, updated = 0, 0
+    while True:
+        query = Article.query.options(load_only(Article.id, Article.content)).filter(Article.id > last_id)
+        if not recompute_all:
+            query = query.filter(Article.excerpt.is_(None))
+        batch = query.order_by(Article.id).limit(batch_size).all()
+        if not batch:
+            break
+        for article in batch:
+            article.excerpt = make_excerpt(article.content)
+        db.session.commit()
+        last_id = batch[-1].id
+        updated += len(batch)
+        click.echo(f"{updated} excerpts written")
+    click.echo(f"Done, {updated} article(s) updated")
+
+@articles_cli.command('render-bodies')
+@click.option('--batch-size', default=200, show_default=True, help='Articles rendered per transaction')
+@click.option('--all', 'rerender_all', is_flag=True, help='Re-render bodies that are already set')
+def render_bodies(batch_size, rerender_all):
+    """Render the sanitized reader HTML of existing articles"""
+    last_id, updated = 0, 0
+    while True:
+        query = Article.query.options(load_only(Article.id, Article.content)).filter(Article.id > last_id)
+        if not rerender_all:
+            query = query.filter(Article.body_html.is_(None))
+        batch = query.order_by(Article.id).limit(batch_size).all()
+        if not batch:
+            break
+        for article in batch:
+            article.body_html = sanitize.render_body(article.content)
+        db.session.commit()
+        page_cache.purge(*(f'article:{article.id}' for article in batch))
+        last_id = batch[-1].id
+        updated += len(batch)
+        click.echo(f"{updated} bodies rendered")
+    click.echo(f"Done, {updated} article(s) updated")
+
+@articles_cli.command('reindex-search')
+def reindex_search():
+    """Rebuild the SQLite full-text search index from the article table"""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo("The search index maintains itself on this database")
+        return
+    with db.engine.begin() as conn:
+        search.rebuild_sqlite_index(conn)
+    click.echo("Search index rebuilt")
+
+@articles_cli.command('import')
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Input format (default: from the file name)')
+@click.option('--chunk-size', default=2000, show_default=True, help='Articles inserted per transaction')
+@click.option('--create-missing', is_flag=True, help='Create categories and departments that do not exist yet')
+@click.option('--default-author', help='Email of the author for records without a known author')
+@click.option('--skip-invalid', is_flag=True, help='Report and skip bad records instead of stopping')
+@click.option('--render-bodies', is_flag=True,
+              help='Render the reader HTML now, at about a third of the import rate, '
+                   'instead of with `flask articles render-bodies` afterwards')
+def import_articles(path, fmt, chunk_size, create_missing, default_author, skip_invalid, render_bodies):
+    """Import articles from a JSON Lines or CSV file ('-' for stdin, .gz is decompressed)"""
+    started = time.perf_counter()
+    with bulk.open_text(path, 'r') as stream:
+        records = bulk.read_records(stream, fmt or bulk.detect_format(path))
+        try:
+            imported, skipped = bulk.import_articles(
+                records, chunk_size=chunk_size, create_missing=create_missing,
+                default_author=default_author, skip_invalid=skip_invalid, render_bodies=render_bodies,
+                on_error=lambda e: click.echo(f"Skipped {e}", err=True),
+                echo=lambda line: click.echo(line, err=True))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    # Imported articles appear on listings, and new categories in the navigation
+    queries.invalidate_site_chrome()
+    elapsed = time.perf_counter() - started
+    click.echo(f"Imported {imported} article(s), skipped {skipped}, in {elapsed:.1f}s "
+               f"({imported / elapsed:.0f}/s)", err=True)
+    if imported and not render_bodies:
+        click.echo("Run `flask articles render-bodies` to store their reader HTML", err=True)
+
+@articles_cli.command('export')
+@click.argument('path', default='-')
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Output format (default: from the file name)')
+@click.option('--chunk-size', default=2000, show_default=True, help='Articles read per query')
+@click.option('--published-only', is_flag=True, help='Leave out drafts')
+@click.option('--category', help='Only articles in this category')
+def export_articles(path, fmt, chunk_size, published_only, category):
+    """Export articles to a JSON Lines or CSV file ('-' for stdout, .gz is compressed)"""
+    with bulk.open_text(path, 'w') as stream:
+        written = bulk.write_records(
+            bulk.export_records(published_only=published_only, category=category, chunk_size=chunk_size),
+            stream, fmt or bulk.detect_format(path))
+    click.echo(f"Exported {written} article(s)", err=True)
+
+@assets_cli.command('build')
+def build_assets():
+    """Minify, fingerprint and precompress the stylesheets and scripts into the dist folder"""
+    report = assets.build(current_app.static_folder, current_app.config['ASSETS_DIST'])
+    for name, target, size, minified, gzipped, brotli in report:
+        click.echo(f"{name} -> {target}  {size} B, minified {minified} B, gzip {gzipped} B, brotli {brotli} B")
+
+@jobs_cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once no job is due instead of waiting for more')
+def jobs_worker(burst):
+    """Run queued background jobs"""
+    click.echo(f"Working on jobs ({'until the queue is empty' if burst else 'Ctrl+C to stop'})")
+    try:
+        jobs.work(burst=burst)
+    except KeyboardInterrupt:
+        pass
+
+@jobs_cli.command('status')
+def jobs_status():
+    """Show how many jobs are queued, running, done and failed"""
+    for status, count in jobs.counts().items():
+        click.echo(f"{status:<8} {count}")
+
+@jobs_cli.command('prune')
+@click.option('--days', default=7, show_default=True, help='Keep finished jobs this many days')
+def jobs_prune(days):
+    """Delete finished jobs older than a number of days"""
+    click.echo(f"Deleted {jobs.prune(timedelta(days=days))} job(s)")
+
+@click.command('export-static')
+@click.option('--output', help='Export directory (default: STATIC_EXPORT_DIR)')
+@click.option('--full', is_flag=True, help='Re-render every page, not only those changed since the last run')
+@with_appcontext
+def export_static(output, full):
+    """Pre-render the homepage, category pages and published articles to static HTML"""
+    root = output or current_app.config.get('STATIC_EXPORT_DIR')
+    if not root:
+        raise click.ClickException("Set STATIC_EXPORT_DIR or pass --output")
+    started = time.perf_counter()
+    written, removed = static_export.export(root, full=full, echo=click.echo)
+    click.echo(f"Wrote {written} page(s), removed {removed}, in {time.perf_counter() - started:.1f}s")
+
+@click.command('generate-data')
+@click.option('--users', default=20, show_default=True)
+@click.option('--categories', default=6, show_default=True)
+@click.option('--departments', default=4, show_default=True)
+@click.option('--articles', default=1000, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='Random seed, for reproducible datasets')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT batch')
+@with_appcontext
+def generate_data(users, categories, departments, articles, seed, batch_size):
+    """Fill the database with synthetic users, categories, departments and articles"""
+    db.create_all()
+    migrations.upgrade()
+    datagen.generate(users=users, categories=categories, departments=departments, articles=articles,
+                     seed=seed, batch_size=batch_size, echo=click.echo)
+    click.echo(f"Accounts reporter0..reporter{users - 1}@sbc.example use password 'password'; reporter0 is an admin")
+
+def init_app(app):
+    """Register the CLI commands on an application"""
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(articles_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(export_static)
+    app.cli.add_command(generate_data)
@@ -0,0 +1,180 @@
+"""Database engine options, SQLite tuning, read replicas and pool metrics
+
+Connection pools are sized with DB_POOL_SIZE, DB_MAX_OVERFLOW and
+DB_POOL_TIMEOUT. Connections are recycled after DB_POOL_RECYCLE seconds.
+Pre-ping, a round trip on every checkout, is off unless DB_POOL_PRE_PING is
+set; turn it on if the server closes idle connections sooner than the
+recycle interval.
+
+SQLite databases get SQLITE_PRAGMAS on every new connection, by default WAL
+journaling with synchronous=NORMAL so readers do not block the writer.
+
+With DATABASE_REPLICA_URLS set, views decorated with @read_from_replica run
+their SELECTs on a replica picked per request, while flushes, bulk UPDATE
+and DELETE statements and every other view use the primary. A request that
+wrote sets a short-lived cookie (DB_READ_YOUR_WRITES seconds), and while it
+is present the decorated views read from the primary too, so editors see
+their own changes despite replication lag. Pages and data cached for every
+reader must not be built from a replica that has not applied a write yet
+either, so page_cache.purge() also sends all readers to the primary for
+DB_READ_YOUR_WRITES seconds (a timestamp in the cache, shared by the workers
+with the redis backend), and results read from a replica as that window
+opens are not cached.
+
+Pool size, connections checked out, overflow and the peak checked out per
+engine are exported on /dashboard/metrics.
+"""
+import random
+import threading
+import time
+from functools import wraps
+from flask import g, request, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+PRIMARY_COOKIE = 'read_primary'
+PRIMARY_UNTIL_KEY = 'db-primary-until'
+
+def engine_options(config, url=None):
+    """SQLAlchemy engine options from the DB_POOL_* settings"""
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    options = {
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', False),
+    }
+    # In-memory SQLite keeps a single connection per thread; there is no pool to size
+    if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+        options.update(
+            pool_size=config.get('DB_POOL_SIZE', 5),
+            max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+        )
+    return options
+
+def writing(clause):
+    return isinstance(clause, UpdateBase)
+
+class RoutingSession(Session):
+    """Session sending the reads of @read_from_replica views to a replica"""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or writing(clause):
+                g.db_wrote = True
+            elif g.get('db_replica'):
+                return g.db_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_from_replica(view):
+    """Run a view's queries on a read replica, unless the client or any cached page was written recently"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions['database'].replicas
+        if replicas and PRIMARY_COOKIE not in request.cookies and not replicas_behind():
+            g.db_replica = random.choice(replicas)
+        return view(*args, **kwargs)
+    return wrapper
+
+def read_primary_for_a_while():
+    """Send every @read_from_replica view to the primary for DB_READ_YOUR_WRITES seconds; called on purge"""
+    window = current_app.config.get('DB_READ_YOUR_WRITES', 10)
+    if current_app.extensions['database'].replicas and window:
+        # The cache extension, looked up directly: app.py imports this module before it
+        current_app.extensions['cache'].set(PRIMARY_UNTIL_KEY, time.time() + window, window)
+
+def replicas_behind():
+    """Whether a write purged cached pages recently enough that replicas may not have applied it"""
+    until = current_app.extensions['cache'].get(PRIMARY_UNTIL_KEY)
+    return until is not None and until > time.time()
+
+def read_stale_replica():
+    """Whether this request read from a replica that may be behind, so its results must not be cached"""
+    return g.get('db_replica') is not None and replicas_behind()
+
+def set_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+    return on_connect
+
+class EngineSet:
+    """Primary and replica engines of one application with their peak checkouts
+
+    Kept in app.extensions['database'].
+    """
+    def __init__(self, primary, replicas):
+        self.replicas = replicas
+        self.engines = {'primary': primary}
+        self.engines.update((f'replica{i}', engine) for i, engine in enumerate(replicas))
+        self.peaks = {}
+        self.lock = threading.Lock()
+
+    def track_peak(self, name, pool):
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            checked_out = pool.checkedout() if hasattr(pool, 'checkedout') else 1
+            with self.lock:
+                if checked_out > self.peaks.get(name, 0):
+                    self.peaks[name] = checked_out
+        return on_checkout
+
+class Database:
+    """Flask extension setting up replicas, SQLite pragmas and pool metrics for the db engines"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Call after db.init_app(), which creates the primary engine"""
+        from app import db
+        with app.app_context():
+            primary = db.engine
+        urls = app.config.get('DATABASE_REPLICA_URLS') or []
+        engines = app.extensions['database'] = EngineSet(
+            primary, [create_engine(url, **engine_options(app.config, url)) for url in urls])
+
+        pragmas = app.config.get('SQLITE_PRAGMAS') or []
+        for name, engine in engines.engines.items():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', set_sqlite_pragmas(pragmas))
+            event.listen(engine, 'checkout', engines.track_peak(name, engine.pool))
+
+        if engines.replicas:
+            app.after_request(self.remember_write)
+
+    def remember_write(self, response):
+        if g.get('db_wrote'):
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=current_app.config.get('DB_READ_YOUR_WRITES', 10),
+                                httponly=True, samesite='Lax')
+        return response
+
+    def pool_status(self):
+        """Pool size, connections checked out, overflow and peak checked out per engine of the current application"""
+        engines = current_app.extensions['database']
+        status = {}
+        for name, engine in engines.engines.items():
+            pool = engine.pool
+            status[name] = {
+                'size': pool.size() if hasattr(pool, 'size') else 1,
+                'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else 0,
+                'overflow': max(pool.overflow(), 0) if hasattr(pool, 'overflow') else 0,
+                'peak': engines.peaks.get(name, 0),
+            }
+        return status
+
+    def render_prometheus(self):
+        """Pool gauges in the Prometheus text exposition format"""
+        gauges = (
+            ('sbc_db_pool_size', 'size', 'Connections kept in the pool'),
+            ('sbc_db_pool_checked_out', 'checked_out', 'Connections currently in use'),
+            ('sbc_db_pool_overflow', 'overflow', 'Connections open beyond the pool size'),
+            ('sbc_db_pool_checked_out_peak', 'peak', 'Most connections in use at once since the worker started'),
+        )
+        status = self.pool_status()
+        lines = []
+        for name, field, help_text in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{{engine="{engine}"}} {values[field]}' for engine, values in status.items()]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,128 @@
+"""Synthetic newsroom data for load testing and benchmarks
+
+Fills the database with users, categories, departments and articles whose
+bodies look like editor output: headings, paragraphs with inline markup,
+links, lists and quotes of realistic length. Rows are written with batched
+INSERTs, and the output is reproducible for a given seed.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Article, Category, Department
+from utils import make_excerpt
+from sanitize import render_body
+import search
+
+WORDS = (
+    "government council minister report election market economy growth inflation budget "
+    "policy community school hospital weather storm flood transport rail city county region "
+    "police court investigation evidence witness statement company shares profit technology "
+    "software data security research university study climate energy power water housing "
+    "families residents workers union strike agreement talks summit leaders officials public "
+    "health service record season team match final coach players fans stadium results "
+    "announced confirmed expected reported according spokesperson yesterday today week "
+    "month year early late new major local national international significant"
+).split()
+
+CATEGORY_NAMES = ["Politics", "Business", "Technology", "Society", "Sports", "Weather",
+                  "Health", "Science", "Culture", "World", "Education", "Environment"]
+DEPARTMENT_NAMES = ["SBC News", "SBC Verify", "SBC Declassify", "SBC Investigation",
+                    "SBC Sport", "SBC Weather Centre", "SBC Business Desk", "SBC World Service"]
+ROLE_TITLES = ["Reporter", "Senior Reporter", "Correspondent", "Editor", "Producer", "Analyst"]
+
+def sentence(rng, min_words=8, max_words=22):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return ' '.join(words).capitalize() + '.'
+
+def paragraph(rng):
+    sentences = [sentence(rng) for _ in range(rng.randint(3, 7))]
+    if rng.random() < 0.4:
+        i = rng.randrange(len(sentences))
+        sentences[i] = f'<strong>{sentences[i]}</strong>'
+    if rng.random() < 0.3:
+        i = rng.randrange(len(sentences))
+        sentences[i] = f'<a href="https://example.com/{rng.choice(WORDS)}">{sentences[i]}</a>'
+    return f"<p>{' '.join(sentences)}</p>"
+
+def article_body(rng, paragraphs):
+    """Editor-style HTML body with the given number of paragraphs"""
+    parts = []
+    for i in range(paragraphs):
+        if i and i % 4 == 0:
+            parts.append(f"<h2>{sentence(rng, 3, 7).rstrip('.')}</h2>")
+        parts.append(paragraph(rng))
+        roll = rng.random()
+        if roll < 0.08:
+            parts.append('<ul>' + ''.join(f'<li>{sentence(rng, 4, 10)}</li>' for _ in range(rng.randint(2, 5))) + '</ul>')
+        elif roll < 0.14:
+            parts.append(f'<blockquote><p>"{sentence(rng)}"</p></blockquote>')
+    return '\n'.join(parts)
+
+def numbered_names(names, count):
+    """`count` names cycling through `names`, numbered from the second round on"""
+    return [names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else '') for i in range(count)]
+
+def ensure_named(model, names):
+    """Ids of rows with the given names, creating the ones that are missing"""
+    existing = {row.name: row.id for row in model.query.all()}
+    missing = [{'name': name, 'created_at': datetime.utcnow()} for name in names if name not in existing]
+    if missing:
+        db.session.execute(insert(model), missing)
+        db.session.commit()
+        existing = {row.name: row.id for row in model.query.all()}
+    return [existing[name] for name in names]
+
+def generate(users=20, categories=6, departments=4, articles=1000, paragraphs=(4, 14),
+             days=365, published_ratio=0.9, seed=42, batch_size=1000, password='password', echo=None):
+    """Insert synthetic data and return the ids of the generated users"""
+    rng = random.Random(seed)
+    category_ids = ensure_named(Category, numbered_names(CATEGORY_NAMES, categories))
+    department_ids = ensure_named(Department, numbered_names(DEPARTMENT_NAMES, departments))
+
+    # One hash for every generated account keeps generation fast
+    password_hash = generate_password_hash(password)
+    existing_emails = {email for (email,) in db.session.query(User.email)}
+    new_users = [{
+        'email': f'reporter{i}@sbc.example', 'password_hash': password_hash, 'name': f'Reporter {i}',
+        'role': 'admin' if i == 0 else 'tenant', 'role_title': rng.choice(ROLE_TITLES),
+        'created_at': datetime.utcnow(),
+    } for i in range(users) if f'reporter{i}@sbc.example' not in existing_emails]
+    if new_users:
+        db.session.execute(insert(User), new_users)
+        db.session.commit()
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)
+                .filter(User.email.like('reporter%@sbc.example')).order_by(User.id)]
+
+    now = datetime.utcnow()
+    written = 0
+    while written < articles:
+        rows = []
+        for _ in range(min(batch_size, articles - written)):
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            content = article_body(rng, rng.randint(*paragraphs))
+            rows.append({
+                'title': sentence(rng, 5, 12).rstrip('.'),
+                'content': content,
+                'body_html': render_body(content),
+                'excerpt': make_excerpt(content),
+                'summary': sentence(rng, 15, 30) if rng.random() < 0.5 else None,
+                'published': rng.random() < published_ratio,
+                'is_breaking': False,
+                'created_at': created_at,
+                'updated_at': created_at,
+                'author_id': rng.choice(user_ids),
+                'category_id': rng.choice(category_ids),
+                'department_id': rng.choice(department_ids) if rng.random() < 0.7 else None,
+            })
+        db.session.execute(insert(Article), rows)
+        db.session.commit()
+        written += len(rows)
+        if echo:
+            echo(f"{written}/{articles} articles")
+
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as conn:
+            search.rebuild_sqlite_index(conn)
+    return user_ids
@@ -0,0 +1,51 @@
+"""RSS and Atom feeds and the XML sitemap
+
+Feeds carry the newest published articles, site-wide or per category. The
+sitemap is an index of shards, each listing the published articles whose
+ids fall in one block of page_cache.SITEMAP_SHARD_SIZE, plus one shard for
+the homepage and category pages. The views are cached by page_cache under
+the scopes the write routes already purge, so they are rebuilt only after an
+article changes, and crawlers polling them get 304s from the cache.
+"""
+from email.utils import format_datetime
+from datetime import timezone
+from flask import current_app, render_template
+from sqlalchemy import func
+from app import db
+from models import Article, Category
+from page_cache import SITEMAP_SHARD_SIZE
+
+FEED_SIZE = 50
+
+def rfc822(dt):
+    """RSS date format for the naive UTC datetimes the models store"""
+    return format_datetime(dt.replace(tzinfo=timezone.utc)) if dt else ''
+
+def rfc3339(dt):
+    """Atom and sitemap date format for the naive UTC datetimes the models store"""
+    return dt.replace(microsecond=0).isoformat() + 'Z' if dt else ''
+
+def xml_response(template, mimetype, **context):
+    return current_app.response_class(render_template(template, **context), mimetype=mimetype)
+
+def latest(query):
+    """The newest articles of a listing query, for a feed"""
+    return query.limit(FEED_SIZE).all()
+
+def sitemap_shards():
+    """(shard number, newest updated_at) for every shard holding published articles"""
+    shard = (Article.id // SITEMAP_SHARD_SIZE).label('shard')
+    return db.session.query(shard, func.max(Article.updated_at)) \
+        .filter(Article.published.is_(True)) \
+        .group_by(shard).order_by(shard).all()
+
+def sitemap_entries(shard):
+    """(id, updated_at) of the published articles in one sitemap shard"""
+    return db.session.query(Article.id, Article.updated_at) \
+        .filter(Article.published.is_(True),
+                Article.id >= shard * SITEMAP_SHARD_SIZE,
+                Article.id < (shard + 1) * SITEMAP_SHARD_SIZE) \
+        .order_by(Article.id).all()
+
+def category_ids():
+    return [id for (id,) in db.session.query(Category.id).order_by(Category.id)]
@@ -0,0 +1,20 @@
+"""Gunicorn settings, read from the environment
+
+Workers are gevent workers by default, so each one holds thousands of idle
+breaking news streams and pages get new banners pushed to them, see
+breaking.py. psycopg2 is made cooperative in each worker, so a query waits
+without blocking the worker's other requests. GUNICORN_WORKER_CLASS=sync
+serves one request at a time per worker; pages then show the banner as of
+their last load.
+"""
+import os
+
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 5000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
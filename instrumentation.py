@@ -0,0 +1,190 @@
+"""Opt-in request performance instrumentation
+
+Enabled with PERF_INSTRUMENTATION=true. Each request records how many SQL
+statements it ran and how long they took (SQLAlchemy engine events), the time
+spent rendering Jinja templates (Flask template signals) and its total
+latency. The numbers go back to the client in a Server-Timing header and are
+aggregated per endpoint over a rolling window of PERF_SAMPLE_SIZE requests,
+which /dashboard/metrics exposes in Prometheus text format. Requests that run
+more than PERF_QUERY_BUDGET statements are logged and counted.
+
+SQL time runs from sending a statement until its rows are fetched. SQLite does
+most of a SELECT's work while rows are fetched, after execute() has returned,
+so rows of session queries are read into a buffer before the clock stops.
+Statements run outside the session, such as the search index rebuild, are
+timed up to execute() only.
+
+Aggregates live in each worker process, so a scrape sees one worker at a time.
+"""
+import math
+import threading
+import time
+from collections import deque
+from flask import g, request, current_app, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# (metric name, per-request field, help text); durations are stored in seconds
+SUMMARIES = (
+    ('sbc_request_duration_seconds', 'total', 'Request latency'),
+    ('sbc_request_sql_queries', 'sql_count', 'SQL statements per request'),
+    ('sbc_request_sql_duration_seconds', 'sql_time', 'Time spent in SQL per request'),
+    ('sbc_request_render_duration_seconds', 'render_time', 'Time spent rendering templates per request'),
+)
+
+def quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+class EndpointStats:
+    """Rolling samples and running totals for one endpoint"""
+    def __init__(self, sample_size):
+        self.samples = {field: deque(maxlen=sample_size) for _, field, _ in SUMMARIES}
+        self.sums = {field: 0.0 for _, field, _ in SUMMARIES}
+        self.count = 0
+        self.over_budget = 0
+
+class Metrics:
+    """Settings and per-endpoint aggregates of one application, kept in app.extensions['instrumentation']"""
+    def __init__(self, config):
+        self.enabled = config.get('PERF_INSTRUMENTATION', False)
+        self.query_budget = config.get('PERF_QUERY_BUDGET', 20)
+        self.sample_size = config.get('PERF_SAMPLE_SIZE', 1024)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, perf, over_budget):
+        with self.lock:
+            stats = self.stats.get(endpoint)
+            if stats is None:
+                stats = self.stats[endpoint] = EndpointStats(self.sample_size)
+            stats.count += 1
+            stats.over_budget += over_budget
+            for _, field, _ in SUMMARIES:
+                stats.samples[field].append(perf[field])
+                stats.sums[field] += perf[field]
+
+    def render_prometheus(self):
+        with self.lock:
+            snapshot = {endpoint: (stats.count, stats.over_budget, dict(stats.sums),
+                                   {field: sorted(values) for field, values in stats.samples.items()})
+                        for endpoint, stats in self.stats.items()}
+
+        lines = []
+        for name, field, help_text in SUMMARIES:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+            for endpoint, (count, _, sums, samples) in sorted(snapshot.items()):
+                for q in QUANTILES:
+                    lines.append(f'{name}{{endpoint="{endpoint}",quantile="{q}"}} {quantile(samples[field], q):g}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {sums[field]:g}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {count}')
+
+        lines += ['# HELP sbc_query_budget_exceeded_total Requests that ran more SQL statements than the budget',
+                  '# TYPE sbc_query_budget_exceeded_total counter']
+        for endpoint, (_, over_budget, _, _) in sorted(snapshot.items()):
+            lines.append(f'sbc_query_budget_exceeded_total{{endpoint="{endpoint}"}} {over_budget}')
+        return '\n'.join(lines) + '\n'
+
+class Instrumentation:
+    """Flask extension collecting per-request SQL, render and latency metrics"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        metrics = app.extensions['instrumentation'] = Metrics(app.config)
+        if not metrics.enabled:
+            return
+
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        before_render_template.connect(self.start_render, app)
+        template_rendered.connect(self.finish_render, app)
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(Engine, 'handle_error', handle_error)
+            event.listen(Session, 'do_orm_execute', do_orm_execute)
+
+    @property
+    def metrics(self):
+        return current_app.extensions['instrumentation']
+
+    @property
+    def enabled(self):
+        return self.metrics.enabled
+
+    def start_request(self):
+        g.perf = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0,
+                  'render_time': 0.0, 'render_started': [], 'session_depth': 0}
+
+    def start_render(self, sender, template, context, **extra):
+        if 'perf' in g:
+            g.perf['render_started'].append(time.perf_counter())
+
+    def finish_render(self, sender, template, context, **extra):
+        if 'perf' in g and g.perf['render_started']:
+            g.perf['render_time'] += time.perf_counter() - g.perf['render_started'].pop()
+
+    def finish_request(self, response):
+        perf = g.pop('perf', None)
+        if perf is None:
+            return response
+        perf['total'] = time.perf_counter() - perf['start']
+        endpoint = request.endpoint or 'unmatched'
+        metrics = self.metrics
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={perf["sql_time"] * 1000:.1f};desc="{perf["sql_count"]} queries"',
+            f'render;dur={perf["render_time"] * 1000:.1f}',
+            f'total;dur={perf["total"] * 1000:.1f}',
+        ])
+
+        over_budget = perf['sql_count'] > metrics.query_budget
+        if over_budget:
+            current_app.logger.warning(f"{request.method} {request.path} ran {perf['sql_count']} queries "
+                                       f"(budget {metrics.query_budget})")
+        metrics.record(endpoint, perf, over_budget)
+        return response
+
+    def render_prometheus(self):
+        """All metrics of the current application in the Prometheus text exposition format"""
+        return self.metrics.render_prometheus()
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['perf_started'].pop()
+    if has_request_context() and 'perf' in g:
+        g.perf['sql_count'] += 1
+        # Statements of a session query are timed with their rows in do_orm_execute()
+        if not g.perf['session_depth']:
+            g.perf['sql_time'] += time.perf_counter() - started
+
+def do_orm_execute(state):
+    """Run a session statement and fetch its rows under the SQL timer"""
+    if not (has_request_context() and 'perf' in g):
+        return None
+    perf = g.perf
+    perf['session_depth'] += 1
+    started = time.perf_counter()
+    try:
+        result = state.invoke_statement()
+        if state.is_select:
+            result = result.freeze()()
+    finally:
+        perf['session_depth'] -= 1
+        if not perf['session_depth']:
+            perf['sql_time'] += time.perf_counter() - started
+    return result
+
+def handle_error(context):
+    started = context.connection.info.get('perf_started') if context.connection is not None else None
+    if started:
+        started.pop()
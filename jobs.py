@@ -0,0 +1,222 @@
+"""Background jobs stored in the database
+
+Work that a write triggers but the editor need not wait for, such as
+re-rendering the static export, is registered as a task and enqueued as a row
+in the job table. Workers claim due jobs one at a time. A claim is a
+conditional UPDATE on the attempt count, so two workers never run the same
+attempt. A failing job is retried with exponential backoff (JOBS_RETRY_DELAY
+seconds, doubled per attempt) until it has used max_attempts, then stays
+`failed` for the dashboard's jobs page, where it can be retried by hand. A
+job left `running` for JOBS_TIMEOUT seconds by a worker that died is claimed
+again.
+
+JOBS_MODE selects who runs the jobs:
+
+    thread  a worker thread in each web process, started by its first request (default)
+    queue   only `flask jobs worker` processes
+    eager   inline when enqueued, with no job row (development and scripts)
+
+Tasks must be idempotent: a worker that dies after finishing a task but
+before recording it runs the task again.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, func, or_, and_
+
+TASKS = {}
+STATUSES = ('queued', 'running', 'done', 'failed')
+
+def task(name):
+    """Register a function as a task; it is called with the keyword arguments given to enqueue()"""
+    def decorator(f):
+        TASKS[name] = f
+        return f
+    return decorator
+
+class JobRunner:
+    """Queue settings and the worker thread of one application, kept in app.extensions['jobs']"""
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config.get('JOBS_MODE', 'thread')
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 2)
+        self.retry_delay = app.config.get('JOBS_RETRY_DELAY', 10)
+        self.timeout = app.config.get('JOBS_TIMEOUT', 300)
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def enqueue(self, name, max_attempts=5, **payload):
+        """Queue a task, or run it now in eager mode; returns the job id (None when eager)"""
+        if name not in TASKS:
+            raise KeyError(f"unknown task {name!r}")
+        if self.mode == 'eager':
+            TASKS[name](**payload)
+            return None
+        from app import db
+        from models import Job
+        # Its own transaction, so the job is visible to workers at once and
+        # does not depend on what the caller does with its session
+        with db.engine.begin() as conn:
+            job_id = conn.execute(Job.__table__.insert().values(
+                name=name, payload=json.dumps(payload), status='queued', attempts=0,
+                max_attempts=max_attempts, run_at=datetime.utcnow(), created_at=datetime.utcnow(),
+            )).inserted_primary_key[0]
+        self._wake.set()
+        return job_id
+
+    def claim(self, worker_id):
+        """Mark the next due job as running for this worker; returns it, or None if there is none"""
+        from app import db
+        from models import Job
+        now = datetime.utcnow()
+        due = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=self.timeout)),
+        )
+        for candidate_id, attempts in db.session.execute(
+                select(Job.id, Job.attempts).where(due).order_by(Job.run_at, Job.id).limit(10)).all():
+            claimed = db.session.execute(
+                update(Job)
+                .where(Job.id == candidate_id, Job.attempts == attempts, Job.status.in_(('queued', 'running')))
+                .values(status='running', attempts=attempts + 1, locked_by=worker_id, locked_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, candidate_id)
+        db.session.commit()
+        return None
+
+    def run_next(self, worker_id):
+        """Claim and run one job; returns whether there was one"""
+        from app import db
+        from models import Job
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        job_id, name, attempts, max_attempts = job.id, job.name, job.attempts, job.max_attempts
+        started = time.perf_counter()
+        try:
+            if name not in TASKS:
+                raise KeyError(f"unknown task {name!r}")
+            TASKS[name](**json.loads(job.payload))
+        except Exception as e:
+            db.session.rollback()
+            failed = attempts >= max_attempts
+            self.app.logger.exception(f"Job {job_id} ({name}) failed, attempt {attempts} of {max_attempts}")
+            values = {'status': 'failed' if failed else 'queued', 'last_error': f"{type(e).__name__}: {e}"}
+            if failed:
+                values['finished_at'] = datetime.utcnow()
+            else:
+                values['run_at'] = datetime.utcnow() + timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+        else:
+            values = {'status': 'done', 'finished_at': datetime.utcnow(), 'last_error': None}
+            self.app.logger.info(f"Job {job_id} ({name}) done in {(time.perf_counter() - started) * 1000:.0f} ms")
+        db.session.execute(update(Job).where(Job.id == job_id, Job.locked_by == worker_id).values(**values)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        return True
+
+    def work(self, worker_id=None, stop=None, burst=False):
+        """Run jobs until stopped; with burst, only until the queue has nothing due"""
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+        while not (stop and stop.is_set()):
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    ran = self.run_next(worker_id)
+            except Exception:
+                self.app.logger.exception("Job worker could not reach the queue")
+                ran = False
+            if ran:
+                continue
+            if burst:
+                return
+            self._wake.wait(self.poll_interval)
+
+    def start_thread(self):
+        """Start this process's worker thread, once; registered as a before_request hook in thread mode"""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self.work, name='jobs', daemon=True)
+                self._thread.start()
+                self._thread_pid = os.getpid()
+
+    def retry(self, job_id):
+        """Queue a failed job again with a fresh set of attempts"""
+        from app import db
+        from models import Job
+        retried = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'failed')
+            .values(status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        self._wake.set()
+        return bool(retried)
+
+    def prune(self, older_than):
+        """Delete finished jobs older than a timedelta; returns how many"""
+        from app import db
+        from models import Job
+        deleted = db.session.execute(
+            delete(Job).where(Job.status == 'done', Job.finished_at < datetime.utcnow() - older_than)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return deleted
+
+    def counts(self):
+        """Number of jobs per status"""
+        from app import db
+        from models import Job
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(db.session.execute(select(Job.status, func.count(Job.id)).group_by(Job.status)).all())
+        return counts
+
+class Jobs:
+    """Flask extension enqueuing tasks and running them in worker threads or processes"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        runner = app.extensions['jobs'] = JobRunner(app)
+        if runner.mode == 'thread':
+            app.before_request(runner.start_thread)
+
+    @property
+    def runner(self):
+        return current_app.extensions['jobs']
+
+    @property
+    def mode(self):
+        return self.runner.mode
+
+    def enqueue(self, name, max_attempts=5, **payload):
+        """Queue a task, or run it now in eager mode; returns the job id (None when eager)"""
+        return self.runner.enqueue(name, max_attempts, **payload)
+
+    def work(self, worker_id=None, stop=None, burst=False):
+        """Run jobs until stopped; with burst, only until the queue has nothing due"""
+        self.runner.work(worker_id, stop, burst)
+
+    def retry(self, job_id):
+        """Queue a failed job again with a fresh set of attempts"""
+        return self.runner.retry(job_id)
+
+    def prune(self, older_than):
+        """Delete finished jobs older than a timedelta; returns how many"""
+        return self.runner.prune(older_than)
+
+    def counts(self):
+        """Number of jobs per status"""
+        return self.runner.counts()
@@ -1,4 +1,10 @@
-from app import app
+from app import create_app
+from bootstrap import bootstrap
+
+app = create_app()
 
 if __name__ == '__main__':
+    # The development server sets up the database itself; deployments run `flask --app main bootstrap`
+    with app.app_context():
+        bootstrap()
     app.run(host='0.0.0.0', port=5000, debug=True)
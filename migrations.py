@@ -0,0 +1,119 @@
+"""Versioned schema migrations
+
+db.create_all() only creates missing tables, it never changes existing ones.
+Schema changes to existing tables are therefore added here as numbered steps
+and recorded in the schema_version table, so SQLite and Postgres databases
+created by older releases catch up when `upgrade()` runs. Fresh databases
+already get the current schema from the models, so every step must be
+idempotent.
+"""
+from datetime import datetime
+from sqlalchemy import inspect
+from app import db
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a migration step; steps run in version order"""
+    def decorator(f):
+        MIGRATIONS.append((version, description, f))
+        return f
+    return decorator
+
+def create_model_indexes(conn, model, *names):
+    """Create the named indexes declared on a model if they are missing"""
+    existing = {index['name'] for index in inspect(conn).get_indexes(model.__tablename__)}
+    for index in model.__table__.indexes:
+        if index.name in names and index.name not in existing:
+            index.create(conn)
+
+def add_model_column(conn, model, name):
+    """Add a column declared on a model to its existing table if it is missing"""
+    table = model.__table__
+    if name in {column['name'] for column in inspect(conn).get_columns(table.name)}:
+        return
+    column = table.columns[name]
+    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(conn.dialect)}')
+
+def applied_versions(conn):
+    """Versions already recorded in schema_version"""
+    return {row.version for row in conn.execute(db.select(schema_version.c.version))}
+
+def upgrade(engine=None, logger=None):
+    """Apply every pending migration, each in its own transaction"""
+    engine = engine or db.engine
+    schema_version.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(schema_version.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()))
+        if logger:
+            logger.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+@migration(1, 'Composite indexes for article listing queries')
+def add_article_listing_indexes(conn):
+    from models import Article
+    create_model_indexes(
+        conn, Article,
+        'ix_article_published_created',
+        'ix_article_category_published_created',
+        'ix_article_author_created',
+        'ix_article_created',
+        'ix_article_breaking_published',
+    )
+
+@migration(2, 'Plain-text article excerpts')
+def add_article_excerpt(conn):
+    from models import Article
+    add_model_column(conn, Article, 'excerpt')
+
+@migration(3, 'Full-text search index over article title, summary and content')
+def add_article_search(conn):
+    if conn.dialect.name == 'sqlite':
+        import search
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS article_search "
+            "USING fts5(title, summary, body, tokenize='porter unicode61')"
+        )
+        search.rebuild_sqlite_index(conn)
+    elif conn.dialect.name == 'postgresql':
+        conn.exec_driver_sql(
+            "ALTER TABLE article ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(summary, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'C')) STORED"
+        )
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_article_search_vector ON article USING GIN (search_vector)"
+        )
+
+@migration(4, 'Indexes for per-author and per-department article counts')
+def add_article_count_indexes(conn):
+    from models import Article
+    create_model_indexes(conn, Article, 'ix_article_author_published', 'ix_article_department_published')
+
+@migration(5, 'Background job queue')
+def add_job_table(conn):
+    from models import Job
+    Job.__table__.create(conn, checkfirst=True)
+
+@migration(6, 'Sanitized article bodies rendered at save time')
+def add_article_body_html(conn):
+    from models import Article
+    add_model_column(conn, Article, 'body_html')
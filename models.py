@@ -38,6 +38,8 @@ class Article(db.Model):
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     summary = db.Column(db.Text)  # Optional summary/excerpt
+    excerpt = db.Column(db.Text)  # Plain-text excerpt derived from content on save
+    body_html = db.Column(db.Text)  # Sanitized body served to readers, rendered from content on save
     published = db.Column(db.Boolean, default=False)
     is_breaking = db.Column(db.Boolean, default=False)
     breaking_message = db.Column(db.String(200))  # Custom breaking news message
@@ -49,5 +51,39 @@ class Article(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     department_id = db.Column(db.Integer, db.ForeignKey('department.id'), nullable=True)
     
+    # Composite indexes matching the public listing filters, all sorted by (created_at, id)
+    __table_args__ = (
+        db.Index('ix_article_published_created', 'published', 'created_at', 'id'),
+        db.Index('ix_article_category_published_created', 'category_id', 'published', 'created_at', 'id'),
+        db.Index('ix_article_author_created', 'author_id', 'created_at', 'id'),
+        db.Index('ix_article_created', 'created_at', 'id'),
+        db.Index('ix_article_breaking_published', 'is_breaking', 'published'),
+        # Covering indexes for the per-author and per-department counts on the admin pages
+        db.Index('ix_article_author_published', 'author_id', 'published'),
+        db.Index('ix_article_department_published', 'department_id', 'published'),
+    )
+    
     def __repr__(self):
         return f'<Article {self.title}>'
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Registered task name, see jobs.py
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not before; pushed back on retry
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Workers look for the oldest due job of a status
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
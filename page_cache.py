@@ -0,0 +1,113 @@
+"""Rendered-response cache for anonymous readers
+
+Pages are cached under their URL plus the version of every scope they depend
+on: `site` (navigation, breaking banner and anything else shared by all
+pages) and the scopes named by the view, such as `listing`,
+`category:<id>` or `article:<id>`. A write calls purge() with the scopes it
+touched; that gives those scopes new versions, so exactly the affected
+entries stop matching and age out of the cache.
+
+Versions are opaque timestamps rather than counters, so a version evicted
+from the cache comes back as a new value instead of resurrecting old
+entries.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+from flask import request, session, g, current_app, make_response
+from flask_login import current_user
+from app import cache, jobs
+import database
+import static_export
+
+SITE_SCOPE = 'site'
+# Articles per sitemap shard; shard n lists the ids from n * SITEMAP_SHARD_SIZE up
+SITEMAP_SHARD_SIZE = 10000
+
+def scope_version(scope):
+    """Current version of a cache scope"""
+    key = f'page-version:{scope}'
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.set(key, version, ttl=0)
+    return version
+
+def purge(*scopes):
+    """Invalidate every cached page that depends on any of the given scopes"""
+    # First, so no page rebuilt under the new versions comes from a replica without the write
+    database.read_primary_for_a_while()
+    for scope in set(scopes):
+        cache.set(f'page-version:{scope}', time.time_ns(), ttl=0)
+    if static_export.export_dir():
+        # Re-rendering exported files takes far longer than the write itself
+        jobs.enqueue('static_export.refresh', scopes=sorted(set(scopes)),
+                     purged_at=datetime.utcnow().isoformat())
+
+def purge_article(article_id, *category_ids):
+    """Invalidate an article page, the listings and feeds of its categories, the homepage and its sitemap shard"""
+    purge('listing', f'article:{article_id}', f'sitemap:{article_id // SITEMAP_SHARD_SIZE}',
+          *(f'category:{category_id}' for category_id in category_ids))
+
+def mark_last_modified(*timestamps):
+    """Record the newest content timestamp on the page for its Last-Modified header"""
+    newest = max((t for t in timestamps if t), default=None)
+    if newest and (g.get('last_modified') is None or newest > g.last_modified):
+        g.last_modified = newest
+
+def is_cacheable_request():
+    """Only anonymous GETs without pending flash messages share cached pages"""
+    return (
+        current_app.config.get('PAGE_CACHE_ENABLED', True)
+        and request.method in ('GET', 'HEAD')
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+        # Exported pages go to disk; keeping them in the cache as well would only fill it
+        and not request.environ.get(static_export.EXPORT_ENVIRON)
+    )
+
+def page_key(scopes):
+    """Cache key for the current URL and the current versions of its scopes"""
+    versions = '/'.join(str(scope_version(scope)) for scope in (SITE_SCOPE,) + scopes)
+    return f'page:{versions}:{request.full_path}'
+
+def build_response(entry):
+    """Conditional response for a cache entry, answering 304 when the client copy is current"""
+    response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+    response.set_etag(entry['etag'])
+    if entry['last_modified']:
+        response.last_modified = entry['last_modified']
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+def cached_page(*scopes):
+    """Cache a view's rendered page for anonymous readers
+
+    Scopes may reference view arguments, e.g. 'article:{article_id}'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if not is_cacheable_request():
+                return view(**kwargs)
+
+            key = page_key(tuple(scope.format(**kwargs) for scope in scopes))
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200 or session.modified or database.read_stale_replica():
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'etag': hashlib.sha256(body).hexdigest(),
+                    'last_modified': g.get('last_modified'),
+                    'mimetype': response.mimetype,
+                }
+                cache.set(key, entry, current_app.config.get('PAGE_CACHE_TTL'))
+            return build_response(entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,95 @@
+"""Password hashing off the request thread
+
+Hashing and checking passwords are deliberately slow. They run in a small
+pool of worker processes (PASSWORD_HASH_WORKERS) instead of the process
+serving the request, so a burst of logins uses at most that many cores,
+and at most PASSWORD_HASH_QUEUE operations wait for them. A request that
+cannot get a slot within PASSWORD_HASH_TIMEOUT seconds gets HasherBusy
+rather than adding to the backlog. PASSWORD_HASH_WORKERS=0 hashes inline.
+
+PASSWORD_HASH_METHOD is a Werkzeug method string with its cost parameters,
+such as scrypt:32768:8:1 or pbkdf2:sha256:600000. Stored hashes made with
+another method or cost report needs_rehash() and are replaced at the next
+successful login.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HasherBusy(RuntimeError):
+    """Every slot of the hashing pool stayed taken for PASSWORD_HASH_TIMEOUT seconds"""
+
+class HashingPool:
+    """Worker processes and hashing settings of one application, kept in app.extensions['passwords']"""
+    def __init__(self, config):
+        self.method = config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        self.workers = config.get('PASSWORD_HASH_WORKERS', 2)
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', 5)
+        self.slots = threading.BoundedSemaphore(max(self.workers, 1) + config.get('PASSWORD_HASH_QUEUE', 8))
+        self.reference = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        """The process pool, started on first use in each process (gunicorn forks after import)"""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                # spawn, not fork: a forked worker would inherit database connections and locks
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def run(self, function, *args):
+        if not self.workers:
+            return function(*args)
+        if not self.slots.acquire(timeout=self.timeout):
+            raise HasherBusy("password hashing pool is saturated")
+        try:
+            return self.executor().submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+class PasswordHasher:
+    """Flask extension running password hashing in a bounded process pool"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['passwords'] = HashingPool(app.config)
+
+    @property
+    def pool(self):
+        return current_app.extensions['passwords']
+
+    def hash(self, password):
+        """Hash a new password with the configured method"""
+        pool = self.pool
+        return pool.run(generate_password_hash, password, pool.method)
+
+    def reference(self):
+        """A hash made with the configured method, computed once"""
+        pool = self.pool
+        if pool.reference is None:
+            pool.reference = self.hash('')
+        return pool.reference
+
+    def verify(self, password_hash, password):
+        """Check a password against its stored hash
+
+        Without a stored hash (no such account) a hash is still checked, so
+        the response takes as long and does not reveal which emails exist.
+        """
+        if password_hash is None:
+            self.pool.run(check_password_hash, self.reference(), password)
+            return False
+        return self.pool.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with another method or cost than the configured one"""
+        # Werkzeug fills in default costs (scrypt -> scrypt:32768:8:1), so compare with a real hash
+        return password_hash.split('$', 1)[0] != self.reference().split('$', 1)[0]
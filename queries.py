@@ -0,0 +1,239 @@
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import defer, joinedload, make_transient_to_detached
+from flask import current_app
+from app import db, cache
+from models import User, Article, Category
+import page_cache
+import database
+
+CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+# Largest id a cursor may carry; bigger numbers overflow the database integer type
+MAX_CURSOR_ID = 2 ** 63 - 1
+SITE_CHROME_KEY = 'site-chrome'
+
+# User columns the templates and permission checks read; password_hash is loaded only on demand
+USER_CACHE_FIELDS = ('id', 'email', 'name', 'role', 'role_title', 'created_at')
+
+ArticleCounts = namedtuple('ArticleCounts', ['total', 'published'])
+
+class KeysetPage:
+    """One page of articles with cursors for the neighbouring pages"""
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+def with_relations():
+    """Article query with author, category and department loaded in the same SELECT"""
+    return Article.query.options(
+        joinedload(Article.author),
+        joinedload(Article.category),
+        joinedload(Article.department),
+    )
+
+def listing_query():
+    """Base query for article cards; the full HTML body is never loaded for listings"""
+    return with_relations().options(defer(Article.content), defer(Article.body_html))
+
+def published_articles():
+    """Published articles, newest first"""
+    return listing_query() \
+        .filter(Article.published.is_(True)) \
+        .order_by(Article.created_at.desc(), Article.id.desc())
+
+def category_articles(category_id):
+    """Published articles in a category, newest first"""
+    return published_articles().filter(Article.category_id == category_id)
+
+def dashboard_articles(author_id=None):
+    """All articles for the admin dashboard, or only one author's articles"""
+    query = listing_query()
+    if author_id is not None:
+        query = query.filter(Article.author_id == author_id)
+    return query.order_by(Article.created_at.desc(), Article.id.desc())
+
+def get_article_or_404(article_id):
+    """Load a single article with its relations or abort with 404
+
+    The raw editor HTML is only loaded if the article has no rendered body yet.
+    """
+    return with_relations().options(defer(Article.content)).filter(Article.id == article_id).first_or_404()
+
+def breaking_news_query():
+    """The published article currently flagged as breaking news"""
+    return Article.query.filter_by(is_breaking=True, published=True)
+
+def site_chrome():
+    """Category navigation and breaking news banner as plain data that can be cached across requests"""
+    breaking = breaking_news_query().first()
+    return {
+        'categories': [{'id': c.id, 'name': c.name} for c in Category.query.order_by(Category.id).all()],
+        'breaking_news': {
+            'id': breaking.id,
+            'title': breaking.title,
+            'breaking_message': breaking.breaking_message,
+        } if breaking else None,
+    }
+
+def get_or_load(key, factory, ttl=None):
+    """cache.get_or_set(), except that results read from a replica behind a recent write are not stored"""
+    value = cache.get(key)
+    if value is None:
+        value = factory()
+        if not database.read_stale_replica():
+            cache.set(key, value, ttl)
+    return value
+
+def cached_site_chrome():
+    """Site chrome from the cache, loaded from the database at most once per TTL"""
+    return get_or_load(SITE_CHROME_KEY, site_chrome, current_app.config['SITE_CHROME_TTL'])
+
+def invalidate_site_chrome():
+    """Drop the cached site chrome, and every cached page showing it, after categories or breaking news change"""
+    cache.delete(SITE_CHROME_KEY)
+    page_cache.purge(page_cache.SITE_SCOPE)
+
+def published_counts_by_category():
+    """Map of category id to number of published articles, in one grouped query"""
+    rows = db.session.query(Article.category_id, func.count(Article.id)) \
+        .filter(Article.published.is_(True)) \
+        .group_by(Article.category_id) \
+        .all()
+    return dict(rows)
+
+def listing_versions():
+    """Versions of the scopes every listing depends on, for keys of data cached alongside the page cache"""
+    return '/'.join(str(page_cache.scope_version(scope)) for scope in (page_cache.SITE_SCOPE, 'listing'))
+
+def cached_published_counts_by_category():
+    """Published counts per category, grouped over the article table at most once per purge
+
+    The key carries the site and listing scope versions, so purge_article()
+    and site-wide purges replace it like the pages showing the counts.
+    """
+    return get_or_load(f'category-counts:{listing_versions()}', published_counts_by_category)
+
+def published_count():
+    """SUM expression counting published articles"""
+    return func.coalesce(func.sum(case((Article.published.is_(True), 1), else_=0)), 0)
+
+def article_counts_query(column):
+    """Grouped query of total and published article counts per value of an Article column"""
+    return db.session.query(column, func.count(Article.id), published_count()).group_by(column)
+
+def article_counts_by(column):
+    """Total and published article counts per value of an Article column, in one grouped query
+
+    Missing keys read as zero counts, so templates can index the result directly.
+    """
+    rows = article_counts_query(column).all()
+    return zero_default((key, ArticleCounts(total, published)) for key, total, published in rows)
+
+def cached_article_counts_by(column):
+    """article_counts_by() grouped over the article table at most once per purge
+
+    Cached like the homepage category counts: every article write purges the
+    listing scope, and bulk imports and department changes the site scope.
+    """
+    counts = get_or_load(f'article-counts:{column.key}:{listing_versions()}',
+                         lambda: dict(article_counts_by(column)))
+    return zero_default(counts.items())
+
+def zero_default(items):
+    counts = defaultdict(lambda: ArticleCounts(0, 0))
+    counts.update(items)
+    return counts
+
+def dashboard_stats(author_id=None):
+    """Article totals for the dashboard cards, plus the user count for admins, in one round trip"""
+    columns = [func.count(Article.id), published_count()]
+    if author_id is None:
+        columns.append(select(func.count(User.id)).scalar_subquery())
+    query = db.session.query(*columns)
+    if author_id is not None:
+        query = query.filter(Article.author_id == author_id)
+    row = query.one()
+    return {
+        'total_articles': row[0],
+        'published_articles': row[1],
+        'total_users': row[2] if author_id is None else None,
+    }
+
+def encode_cursor(article):
+    """Opaque cursor for an article's position in a newest-first listing"""
+    return f"{article.created_at.strftime(CURSOR_FORMAT)}-{article.id}"
+
+def decode_cursor(cursor):
+    """Parse a cursor back into (created_at, id), or None if it is malformed"""
+    try:
+        timestamp, article_id = cursor.split('-')
+        created_at, article_id = datetime.strptime(timestamp, CURSOR_FORMAT), int(article_id)
+    except (AttributeError, ValueError):
+        return None
+    if not 0 <= article_id <= MAX_CURSOR_ID:
+        return None
+    return created_at, article_id
+
+def keyset_query(query, after=None, before=None, per_page=20):
+    """The bounded query paginate() runs for a cursor, plus whether it reads newest-last"""
+    key = tuple_(Article.created_at, Article.id)
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        query = query.filter(key > before) \
+            .order_by(None).order_by(Article.created_at.asc(), Article.id.asc())
+    elif after:
+        query = query.filter(key < after)
+    return query.limit(per_page + 1), before is not None
+
+def paginate(query, after=None, before=None, per_page=20):
+    """Keyset-paginate a newest-first article query on (created_at, id)
+
+    `after` returns the page of older articles following that cursor, `before`
+    the page of newer articles preceding it. Only per_page + 1 rows are read
+    whatever the depth, so deep archive pages cost the same as the first one.
+    """
+    page_query, backwards = keyset_query(query, after, before, per_page)
+    rows = page_query.all()
+
+    if backwards:
+        has_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_older = True
+    else:
+        has_older = len(rows) > per_page
+        items = rows[:per_page]
+        has_newer = decode_cursor(after) is not None
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if items and has_older else None,
+        prev_cursor=encode_cursor(items[0]) if items and has_newer else None,
+    )
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+def load_cached_user(user_id):
+    """Session user re-hydrated from the cache, falling back to the database on a miss
+
+    The cached copy is attached to the session without a SELECT, so routes can
+    still modify and commit it; columns left out of the cache load on first access.
+    """
+    fields = cache.get(user_cache_key(user_id))
+    if fields is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_cache_key(user_id), {name: getattr(user, name) for name in USER_CACHE_FIELDS},
+                      current_app.config['USER_CACHE_TTL'])
+        return user
+
+    user = User(**fields)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_cached_user(user_id):
+    """Drop a user's cached session copy after their profile, role or account changes"""
+    cache.delete(user_cache_key(user_id))
@@ -0,0 +1,93 @@
+"""Login attempt limits
+
+Attempts are counted in sliding windows of LOGIN_RATE_WINDOW seconds: all
+attempts per client IP (LOGIN_IP_LIMIT), and failed attempts per account
+(LOGIN_ACCOUNT_LIMIT). A successful login clears its account's count. Limits
+are checked before any password is hashed, so rejected attempts cost no CPU.
+
+Counts live in each worker process, so with N workers a client can make up
+to N times the limit before every worker refuses it.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import current_app
+
+class SlidingWindow:
+    """Thread-safe event log per key; least recently used keys are dropped beyond max_keys"""
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        return events
+
+    def retry_after(self, key):
+        """Seconds until the key may act again, 0 if it is under the limit"""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if not events or len(events) < self.limit:
+                return 0
+            return max(1, math.ceil(events[0] + self.window - now))
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if events is None:
+                events = self._events[key] = deque(maxlen=self.limit)
+            events.append(now)
+            self._events.move_to_end(key)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+class LoginLimiter:
+    """Flask extension limiting login attempts per client IP and per account
+
+    The windows of each application live in app.extensions['login_limiter'].
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        window = app.config.get('LOGIN_RATE_WINDOW', 300)
+        app.extensions['login_limiter'] = (
+            SlidingWindow(app.config.get('LOGIN_IP_LIMIT', 20), window),
+            SlidingWindow(app.config.get('LOGIN_ACCOUNT_LIMIT', 5), window),
+        )
+
+    def windows(self):
+        """The per-IP and per-account windows of the current application"""
+        return current_app.extensions['login_limiter']
+
+    def attempt(self, ip, account):
+        """Record a login attempt; returns seconds to wait if it must be refused, otherwise 0"""
+        by_ip, by_account = self.windows()
+        account = account.strip().lower()
+        retry_after = max(by_ip.retry_after(ip), by_account.retry_after(account))
+        if not retry_after:
+            by_ip.hit(ip)
+        return retry_after
+
+    def failed(self, account):
+        by_ip, by_account = self.windows()
+        by_account.hit(account.strip().lower())
+
+    def succeeded(self, account):
+        by_ip, by_account = self.windows()
+        by_account.reset(account.strip().lower())
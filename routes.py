@@ -1,72 +1,216 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+import hmac
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import app, db
-from models import User, Article, Category, Department
+from app import db, database, instrumentation, passwords, login_limiter, breaking_news, jobs
+from passwords import HasherBusy
+from models import User, Article, Category, Department, Job
 from forms import LoginForm, RegisterForm, ArticleForm, CategoryForm, DepartmentForm, ProfileForm
-from utils import admin_required, format_datetime, truncate_text
+from utils import admin_required, format_datetime, truncate_text, make_excerpt
+import queries
+import search
+import sanitize
+import feeds
+import page_cache
+from page_cache import cached_page
+from database import read_from_replica
+from streaming import render_page, stream_flush, html_slices
+
+bp = Blueprint('main', __name__)
 
 # Add template filters
-app.jinja_env.filters['datetime'] = format_datetime
-app.jinja_env.filters['truncate'] = truncate_text
+bp.add_app_template_filter(format_datetime, 'datetime')
+bp.add_app_template_filter(truncate_text, 'truncate')
+bp.add_app_template_filter(feeds.rfc822, 'rfc822')
+bp.add_app_template_filter(feeds.rfc3339, 'rfc3339')
+bp.add_app_template_global(stream_flush, 'stream_flush')
+bp.add_app_template_filter(html_slices, 'html_slices')
+bp.add_app_template_filter(sanitize.render_body, 'render_body')
+
+@bp.app_context_processor
+def inject_site_chrome():
+    """Category navigation and breaking news banner shared by every page"""
+    return queries.cached_site_chrome()
 
-@app.route('/')
+@bp.app_context_processor
+def inject_breaking_news_live():
+    """Whether pages subscribe to the breaking news stream"""
+    return {'breaking_news_live': breaking_news.live()}
+
+@bp.route('/')
+@read_from_replica
+@cached_page('listing')
 def index():
     """Homepage with latest news"""
-    # Get breaking news
-    breaking_news = Article.query.filter_by(is_breaking=True, published=True).first()
-    
     # Get latest articles
-    articles = Article.query.filter_by(published=True).order_by(Article.created_at.desc()).limit(20).all()
+    page = queries.paginate(queries.published_articles(),
+                            after=request.args.get('after'), before=request.args.get('before'))
     
-    # Get categories for navigation
-    categories = Category.query.all()
+    page_cache.mark_last_modified(*(a.updated_at for a in page.items))
     
-    return render_template('index.html', articles=articles, breaking_news=breaking_news, categories=categories)
+    # Get article counts for the category sidebar
+    category_counts = queries.cached_published_counts_by_category()
+    
+    return render_page('index.html', articles=page.items, page=page, category_counts=category_counts)
 
-@app.route('/category/<int:category_id>')
+@bp.route('/category/<int:category_id>')
+@read_from_replica
+@cached_page('category:{category_id}')
 def category(category_id):
     """Show articles in a specific category"""
     category = Category.query.get_or_404(category_id)
-    articles = Article.query.filter_by(category_id=category_id, published=True).order_by(Article.created_at.desc()).all()
-    categories = Category.query.all()
-    breaking_news = Article.query.filter_by(is_breaking=True, published=True).first()
+    page = queries.paginate(queries.category_articles(category_id),
+                            after=request.args.get('after'), before=request.args.get('before'))
+    page_cache.mark_last_modified(*(a.updated_at for a in page.items))
     
-    return render_template('category.html', category=category, articles=articles, categories=categories, breaking_news=breaking_news)
+    return render_page('category.html', category=category, articles=page.items, page=page)
 
-@app.route('/article/<int:article_id>')
+@bp.route('/article/<int:article_id>')
+@read_from_replica
+@cached_page('article:{article_id}')
 def article(article_id):
     """Show individual article"""
-    article = Article.query.get_or_404(article_id)
+    article = queries.get_article_or_404(article_id)
     
     # Only show published articles to non-admin users
     if not article.published and (not current_user.is_authenticated or not current_user.is_admin()):
         abort(404)
     
-    categories = Category.query.all()
-    breaking_news = Article.query.filter_by(is_breaking=True, published=True).first()
+    page_cache.mark_last_modified(article.updated_at)
+    return render_page('article.html', article=article)
+
+@bp.route('/search')
+@read_from_replica
+@cached_page('listing')
+def search_page():
+    """Full-text search over published articles"""
+    terms = search.clean_terms(request.args.get('q', ''))
+    page = search.clamp_page(request.args.get('page', 1, type=int))
+    articles, has_next = search.search_articles(terms, page=page)
     
-    return render_template('article.html', article=article, categories=categories, breaking_news=breaking_news)
+    return render_template('search.html', terms=terms, articles=articles, page=page, has_next=has_next)
+
+@bp.route('/feed.xml')
+@read_from_replica
+@cached_page('listing')
+def feed():
+    """RSS feed of the latest published articles"""
+    articles = feeds.latest(queries.published_articles())
+    page_cache.mark_last_modified(*(a.updated_at for a in articles))
+    return feeds.xml_response('feeds/rss.xml', 'application/rss+xml', articles=articles,
+                              title='SBC News', description='Latest news from the Stepford Broadcasting Corporation',
+                              link=url_for('main.index', _external=True))
+
+@bp.route('/atom.xml')
+@read_from_replica
+@cached_page('listing')
+def atom_feed():
+    """Atom feed of the latest published articles"""
+    articles = feeds.latest(queries.published_articles())
+    page_cache.mark_last_modified(*(a.updated_at for a in articles))
+    return feeds.xml_response('feeds/atom.xml', 'application/atom+xml', articles=articles,
+                              title='SBC News', description='Latest news from the Stepford Broadcasting Corporation',
+                              link=url_for('main.index', _external=True))
+
+@bp.route('/category/<int:category_id>/feed.xml')
+@read_from_replica
+@cached_page('category:{category_id}')
+def category_feed(category_id):
+    """RSS feed of the latest published articles in a category"""
+    category = Category.query.get_or_404(category_id)
+    articles = feeds.latest(queries.category_articles(category_id))
+    page_cache.mark_last_modified(*(a.updated_at for a in articles))
+    return feeds.xml_response('feeds/rss.xml', 'application/rss+xml', articles=articles,
+                              title=f'SBC News - {category.name}', description=f'Latest {category.name} news from SBC',
+                              link=url_for('main.category', category_id=category_id, _external=True))
+
+@bp.route('/sitemap.xml')
+@read_from_replica
+@cached_page('listing')
+def sitemap():
+    """Sitemap index pointing at the page shard and one shard per block of article ids"""
+    shards = feeds.sitemap_shards()
+    page_cache.mark_last_modified(*(updated_at for _, updated_at in shards))
+    return feeds.xml_response('feeds/sitemap_index.xml', 'application/xml', shards=shards)
+
+@bp.route('/sitemap-pages.xml')
+@read_from_replica
+@cached_page()
+def sitemap_pages():
+    """Sitemap of the homepage and category pages"""
+    urls = [(url_for('main.index', _external=True), None)] + \
+        [(url_for('main.category', category_id=id, _external=True), None) for id in feeds.category_ids()]
+    return feeds.xml_response('feeds/sitemap.xml', 'application/xml', urls=urls)
+
+@bp.route('/sitemap-<int:shard>.xml')
+@read_from_replica
+@cached_page('sitemap:{shard}')
+def sitemap_shard(shard):
+    """Sitemap of the published articles in one block of ids"""
+    entries = feeds.sitemap_entries(shard)
+    if not entries:
+        abort(404)
+    page_cache.mark_last_modified(*(updated_at for _, updated_at in entries))
+    urls = [(url_for('main.article', article_id=id, _external=True), updated_at) for id, updated_at in entries]
+    return feeds.xml_response('feeds/sitemap.xml', 'application/xml', urls=urls)
+
+@bp.route('/robots.txt')
+def robots():
+    """Point crawlers at the sitemap"""
+    return f"User-agent: *\nDisallow: /dashboard\nSitemap: {url_for('main.sitemap', _external=True)}\n", \
+        200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@bp.route('/breaking/stream')
+def breaking_stream():
+    """Server-Sent Events carrying the breaking news banner"""
+    breaking_news.start()
+    stream = breaking_news.stream(request.headers.get('Last-Event-ID'))
+    return current_app.response_class(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Keep nginx from buffering events
+        'X-Accel-Buffering': 'no',
+    })
 
 # Authentication routes
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page"""
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
+        # Refuse over-limit attempts before spending any time on hashing
+        retry_after = login_limiter.attempt(request.remote_addr or '', form.email.data)
+        if retry_after:
+            flash('Too many login attempts. Please try again later.', 'error')
+            return render_template('auth/login.html', form=form), 429, {'Retry-After': str(retry_after)}
+
         user = User.query.filter_by(email=form.email.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        try:
+            valid = passwords.verify(user.password_hash if user else None, form.password.data)
+        except HasherBusy:
+            current_app.logger.warning("Password hashing pool saturated, login refused")
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/login.html', form=form), 503, {'Retry-After': '5'}
+
+        if valid:
+            login_limiter.succeeded(form.email.data)
+            try:
+                if passwords.needs_rehash(user.password_hash):
+                    # Upgrade hashes made with an older method or cost while the password is at hand
+                    user.password_hash = passwords.hash(form.password.data)
+                    db.session.commit()
+            except HasherBusy:
+                pass  # upgraded at a later login
             login_user(user)
             next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('dashboard'))
+            return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
+        login_limiter.failed(form.email.data)
         flash('Invalid email or password', 'error')
     
     return render_template('auth/login.html', form=form)
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 @admin_required
 def register():
     """Register new tenant user (admin only)"""
@@ -77,64 +221,69 @@ def register():
             flash('Email address already registered', 'error')
             return render_template('auth/register.html', form=form)
         
+        try:
+            password_hash = passwords.hash(form.password.data)
+        except HasherBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('auth/register.html', form=form), 503, {'Retry-After': '5'}
+
         # Create new user
         user = User(
             email=form.email.data,
             name=form.name.data,
-            password_hash=generate_password_hash(form.password.data),
+            password_hash=password_hash,
             role='tenant'
         )
         db.session.add(user)
         db.session.commit()
         
         flash('User registered successfully', 'success')
-        return redirect(url_for('manage_users'))
+        return redirect(url_for('main.manage_users'))
     
     return render_template('auth/register.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     """Logout user"""
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
 # Dashboard routes
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def dashboard():
     """Main dashboard"""
+    after, before = request.args.get('after'), request.args.get('before')
     if current_user.is_admin():
         # Admin sees all articles
-        articles = Article.query.order_by(Article.created_at.desc()).limit(10).all()
-        total_articles = Article.query.count()
-        published_articles = Article.query.filter_by(published=True).count()
-        total_users = User.query.count()
+        page = queries.paginate(queries.dashboard_articles(), after=after, before=before, per_page=10)
+        stats = queries.dashboard_stats()
     else:
         # Tenant sees only their articles
-        articles = Article.query.filter_by(author_id=current_user.id).order_by(Article.created_at.desc()).limit(10).all()
-        total_articles = Article.query.filter_by(author_id=current_user.id).count()
-        published_articles = Article.query.filter_by(author_id=current_user.id, published=True).count()
-        total_users = None
+        page = queries.paginate(queries.dashboard_articles(author_id=current_user.id),
+                                after=after, before=before, per_page=10)
+        stats = queries.dashboard_stats(author_id=current_user.id)
     
     return render_template('dashboard/dashboard.html', 
-                         articles=articles, 
-                         total_articles=total_articles,
-                         published_articles=published_articles,
-                         total_users=total_users)
+                         articles=page.items, 
+                         page=page,
+                         **stats)
 
-@app.route('/dashboard/create-article', methods=['GET', 'POST'])
+@bp.route('/dashboard/create-article', methods=['GET', 'POST'])
 @login_required
 def create_article():
     """Create new article"""
     form = ArticleForm()
     if form.validate_on_submit():
         # Log the form data for debugging
-        app.logger.info(f"Creating article with published={form.published.data}")
+        current_app.logger.info(f"Creating article with published={form.published.data}")
         
         article = Article(
             title=form.title.data,
             content=form.content.data,
+            excerpt=make_excerpt(form.content.data),
+            body_html=sanitize.render_body(form.content.data),
             summary=form.summary.data,
             category_id=form.category_id.data,
             department_id=form.department_id.data if form.department_id.data != 0 else None,
@@ -149,17 +298,23 @@ def create_article():
             Article.query.filter_by(is_breaking=True).update({'is_breaking': False})
         
         db.session.add(article)
+        db.session.flush()
+        search.index_article(article)
         db.session.commit()
+        page_cache.purge_article(article.id, article.category_id)
+        if article.is_breaking:
+            queries.invalidate_site_chrome()
+            breaking_news.refresh()
         
         # Log the final state for debugging
-        app.logger.info(f"Article created with ID={article.id}, published={article.published}")
+        current_app.logger.info(f"Article created with ID={article.id}, published={article.published}")
         
         flash('Article created successfully', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('dashboard/create_article.html', form=form)
 
-@app.route('/dashboard/edit-article/<int:article_id>', methods=['GET', 'POST'])
+@bp.route('/dashboard/edit-article/<int:article_id>', methods=['GET', 'POST'])
 @login_required
 def edit_article(article_id):
     """Edit existing article"""
@@ -171,8 +326,11 @@ def edit_article(article_id):
     
     form = ArticleForm(obj=article)
     if form.validate_on_submit():
+        old_category_id, was_breaking = article.category_id, article.is_breaking
         article.title = form.title.data
         article.content = form.content.data
+        article.excerpt = make_excerpt(form.content.data)
+        article.body_html = sanitize.render_body(form.content.data)
         article.summary = form.summary.data
         article.category_id = form.category_id.data
         article.department_id = form.department_id.data if form.department_id.data != 0 else None
@@ -182,15 +340,20 @@ def edit_article(article_id):
         
         # If this is breaking news, unset other breaking news
         if form.is_breaking.data:
-            Article.query.filter(Article.id != article_id).update({'is_breaking': False})
+            Article.query.filter(Article.is_breaking.is_(True), Article.id != article_id).update({'is_breaking': False})
         
+        search.index_article(article)
         db.session.commit()
+        page_cache.purge_article(article.id, old_category_id, article.category_id)
+        if was_breaking or article.is_breaking:
+            queries.invalidate_site_chrome()
+            breaking_news.refresh()
         flash('Article updated successfully', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     return render_template('dashboard/edit_article.html', form=form, article=article)
 
-@app.route('/dashboard/delete-article/<int:article_id>', methods=['POST'])
+@bp.route('/dashboard/delete-article/<int:article_id>', methods=['POST'])
 @login_required
 def delete_article(article_id):
     """Delete article"""
@@ -200,19 +363,26 @@ def delete_article(article_id):
     if not current_user.is_admin() and article.author_id != current_user.id:
         abort(403)
     
+    article_id, category_id, was_breaking = article.id, article.category_id, article.is_breaking
+    search.remove_article(article.id)
     db.session.delete(article)
     db.session.commit()
+    page_cache.purge_article(article_id, category_id)
+    if was_breaking:
+        queries.invalidate_site_chrome()
+        breaking_news.refresh()
     flash('Article deleted successfully', 'success')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
-@app.route('/dashboard/manage-users')
+@bp.route('/dashboard/manage-users')
 @admin_required
 def manage_users():
     """Manage users (admin only)"""
-    users = User.query.all()
-    return render_template('dashboard/manage_users.html', users=users)
+    users = User.query.order_by(User.id).all()
+    article_counts = queries.cached_article_counts_by(Article.author_id)
+    return render_template('dashboard/manage_users.html', users=users, article_counts=article_counts)
 
-@app.route('/dashboard/delete-user/<int:user_id>', methods=['POST'])
+@bp.route('/dashboard/delete-user/<int:user_id>', methods=['POST'])
 @admin_required
 def delete_user(user_id):
     """Delete user (admin only)"""
@@ -221,14 +391,15 @@ def delete_user(user_id):
     # Prevent deleting admin user
     if user.is_admin():
         flash('Cannot delete admin user', 'error')
-        return redirect(url_for('manage_users'))
+        return redirect(url_for('main.manage_users'))
     
     db.session.delete(user)
     db.session.commit()
+    queries.invalidate_cached_user(user_id)
     flash('User deleted successfully', 'success')
-    return redirect(url_for('manage_users'))
+    return redirect(url_for('main.manage_users'))
 
-@app.route('/dashboard/manage-categories', methods=['GET', 'POST'])
+@bp.route('/dashboard/manage-categories', methods=['GET', 'POST'])
 @admin_required
 def manage_categories():
     """Manage categories (admin only)"""
@@ -241,20 +412,23 @@ def manage_categories():
             category = Category(name=form.name.data)
             db.session.add(category)
             db.session.commit()
+            queries.invalidate_site_chrome()
             flash('Category added successfully', 'success')
-        return redirect(url_for('manage_categories'))
+        return redirect(url_for('main.manage_categories'))
     
-    categories = Category.query.all()
-    departments = Department.query.all()
+    categories = Category.query.order_by(Category.id).all()
+    departments = Department.query.order_by(Department.id).all()
     dept_form = DepartmentForm()
     
     return render_template('dashboard/manage_categories.html', 
                          form=form, 
                          categories=categories, 
                          departments=departments,
+                         category_counts=queries.cached_article_counts_by(Article.category_id),
+                         department_counts=queries.cached_article_counts_by(Article.department_id),
                          dept_form=dept_form)
 
-@app.route('/dashboard/add-department', methods=['POST'])
+@bp.route('/dashboard/add-department', methods=['POST'])
 @admin_required
 def add_department():
     """Add new department (admin only)"""
@@ -269,40 +443,78 @@ def add_department():
             db.session.commit()
             flash('Department added successfully', 'success')
     
-    return redirect(url_for('manage_categories'))
+    return redirect(url_for('main.manage_categories'))
 
-@app.route('/dashboard/delete-category/<int:category_id>', methods=['POST'])
+@bp.route('/dashboard/delete-category/<int:category_id>', methods=['POST'])
 @admin_required
 def delete_category(category_id):
     """Delete category (admin only)"""
     category = Category.query.get_or_404(category_id)
     
     # Check if category has articles
-    if category.articles:
+    if db.session.query(Article.query.filter_by(category_id=category_id).exists()).scalar():
         flash('Cannot delete category with articles', 'error')
     else:
         db.session.delete(category)
         db.session.commit()
+        queries.invalidate_site_chrome()
         flash('Category deleted successfully', 'success')
     
-    return redirect(url_for('manage_categories'))
+    return redirect(url_for('main.manage_categories'))
 
-@app.route('/dashboard/delete-department/<int:department_id>', methods=['POST'])
+@bp.route('/dashboard/delete-department/<int:department_id>', methods=['POST'])
 @admin_required
 def delete_department(department_id):
     """Delete department (admin only)"""
     department = Department.query.get_or_404(department_id)
     
     # Remove department from articles but don't delete articles
-    for article in department.articles:
-        article.department_id = None
+    Article.query.filter_by(department_id=department_id).update({'department_id': None})
     
     db.session.delete(department)
     db.session.commit()
+    page_cache.purge(page_cache.SITE_SCOPE)
     flash('Department deleted successfully', 'success')
-    return redirect(url_for('manage_categories'))
+    return redirect(url_for('main.manage_categories'))
+
+@bp.route('/dashboard/jobs')
+@admin_required
+def manage_jobs():
+    """Background job queue status (admin only)"""
+    status = request.args.get('status')
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter(Job.status == status)
+    return render_template('dashboard/jobs.html', jobs=query.limit(50).all(), counts=jobs.counts(),
+                           status=status, mode=jobs.mode)
+
+@bp.route('/dashboard/jobs/<int:job_id>/retry', methods=['POST'])
+@admin_required
+def retry_job(job_id):
+    """Queue a failed job again (admin only)"""
+    if jobs.retry(job_id):
+        flash('Job queued again', 'success')
+    else:
+        flash('Only failed jobs can be retried', 'error')
+    return redirect(url_for('main.manage_jobs', status='failed'))
+
+@bp.route('/dashboard/metrics')
+def metrics():
+    """Connection pool gauges, plus per-endpoint performance metrics with PERF_INSTRUMENTATION, in Prometheus format
+
+    Readable by admins, or with a METRICS_TOKEN bearer.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.is_admin()):
+        abort(403)
+    
+    body = database.render_prometheus()
+    if instrumentation.enabled:
+        body = instrumentation.render_prometheus() + body
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
-@app.route('/dashboard/profile', methods=['GET', 'POST'])
+@bp.route('/dashboard/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     """Edit user profile"""
@@ -318,19 +530,18 @@ def profile():
             current_user.role_title = form.role_title.data
         
         db.session.commit()
+        queries.invalidate_cached_user(current_user.id)
+        # Author names and titles appear on article cards and pages
+        page_cache.purge(page_cache.SITE_SCOPE)
         flash('Profile updated successfully', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     return render_template('dashboard/profile.html', form=form)
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
-    categories = Category.query.all()
-    breaking_news = Article.query.filter_by(is_breaking=True, published=True).first()
-    return render_template('404.html', categories=categories, breaking_news=breaking_news), 404
+    return render_template('404.html'), 404
 
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def forbidden(error):
-    categories = Category.query.all()
-    breaking_news = Article.query.filter_by(is_breaking=True, published=True).first()
-    return render_template('403.html', categories=categories, breaking_news=breaking_news), 403
+    return render_template('403.html'), 403
@@ -0,0 +1,218 @@
+"""Save-time rendering of article bodies
+
+render_body() turns the HTML coming out of the editor into the compact, safe
+markup stored in Article.body_html and sent to readers:
+
+- Only allowlisted tags and attributes survive. Scripts, styles and embedded
+  objects are dropped with their content, unknown tags are unwrapped, inline
+  `style` attributes go, and classes are kept only for the editor's own
+  `ql-` alignment and indent classes.
+- Links may only use http(s), mailto or relative URLs; external links open
+  with rel="noopener noreferrer".
+- Inline base64 images are written once to MEDIA_DIR under the hash of their
+  bytes and referenced by URL instead. Narrower variants are written too
+  (Pillow), and the image gets srcset/sizes and its intrinsic width and
+  height.
+- Every image is marked loading="lazy" decoding="async".
+
+The raw editor HTML stays in Article.content for editing; `flask articles
+render-bodies` fills body_html for rows saved before this existed and for
+bulk imports. Until then article pages render the body on the fly.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+from flask import current_app
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b', 'em', 'i', 'u', 's', 'sub', 'sup',
+    'blockquote', 'pre', 'code', 'ul', 'ol', 'li', 'a', 'img', 'figure', 'figcaption',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td', 'span', 'div',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan'},
+    'ol': {'start'},
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Dropped together with everything inside them
+DROPPED_CONTENT = {'script', 'style', 'iframe', 'object', 'noscript', 'template', 'svg', 'math', 'head', 'title'}
+SAFE_SCHEMES = {'', 'http', 'https', 'mailto'}
+WHITESPACE = re.compile(r'\s+')
+EDITOR_CLASS = re.compile(r'^ql-[a-z0-9-]+$')
+DATA_IMAGE = re.compile(r'^data:image/(png|jpeg|gif|webp);base64,(.*)$', re.IGNORECASE | re.DOTALL)
+EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'gif': 'gif', 'webp': 'webp'}
+# Widths of the responsive variants, written for images wider than each
+VARIANT_WIDTHS = (480, 960, 1440)
+IMAGE_SIZES = '(max-width: 768px) 100vw, 760px'
+
+def safe_url(url):
+    """Whether a link target uses an allowed scheme (or none)"""
+    try:
+        return urlsplit(url.strip()).scheme.lower() in SAFE_SCHEMES
+    except ValueError:
+        return False
+
+def replace_file(path, write):
+    """Create a file through write(temporary path) and move it into place, so readers never see part of it"""
+    # Distinct per thread: two requests in one worker may save the same image at once
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def write_bytes(data):
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return write
+
+def save_image(kind, data):
+    """Write decoded image bytes under their hash; returns img attributes pointing at the file(s)"""
+    media_dir = current_app.config['MEDIA_DIR']
+    media_url = current_app.config['MEDIA_URL'].rstrip('/')
+    ext = EXTENSIONS[kind.lower()]
+    name = f"{hashlib.sha256(data).hexdigest()[:24]}.{ext}"
+    path = os.path.join(media_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(media_dir, exist_ok=True)
+        replace_file(path, write_bytes(data))
+    attributes = {'src': f'{media_url}/{name}'}
+    attributes.update(image_variants(path, media_url, name))
+    return attributes
+
+def image_variants(path, media_url, name):
+    """Narrower copies of an image with srcset/sizes and its dimensions"""
+    # Imported here so only saving an article with an inline image loads Pillow
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            if getattr(image, 'is_animated', False):
+                return {'width': str(width), 'height': str(height)}
+            root, ext = os.path.splitext(name)
+            srcset = []
+            for variant_width in VARIANT_WIDTHS:
+                if variant_width >= width:
+                    break
+                variant = f'{root}-{variant_width}{ext}'
+                variant_path = os.path.join(os.path.dirname(path), variant)
+                if not os.path.exists(variant_path):
+                    resized = image.resize((variant_width, round(height * variant_width / width)))
+                    replace_file(variant_path, lambda tmp: resized.save(tmp, format=image.format))
+                srcset.append(f'{media_url}/{variant} {variant_width}w')
+    except (OSError, Image.DecompressionBombError):
+        # Not an image Pillow can read, or too many pixels to decode safely; serve the original alone
+        return {}
+    attributes = {'width': str(width), 'height': str(height)}
+    if srcset:
+        srcset.append(f'{media_url}/{name} {width}w')
+        attributes.update(srcset=', '.join(srcset), sizes=IMAGE_SIZES)
+    return attributes
+
+class BodySanitizer(HTMLParser):
+    """Rebuilds editor HTML from allowlisted tags and attributes"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_CONTENT:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        attributes = self.clean_attributes(tag, attrs)
+        if attributes is None:
+            return
+        self.out.append(f'<{tag}' + ''.join(f' {name}="{escape(value)}"' for name, value in attributes.items())
+                        + '>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROPPED_CONTENT:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_CONTENT:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # Close anything left open inside this element so the output stays well nested
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        if 'pre' not in self.open_tags:
+            data = WHITESPACE.sub(' ', data)
+        self.out.append(escape(data, quote=False))
+
+    def clean_attributes(self, tag, attrs):
+        """Allowed attributes of a tag, or None to drop the tag"""
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attributes = {}
+        for name, value in attrs:
+            value = value or ''
+            if name == 'class':
+                classes = [c for c in value.split() if EDITOR_CLASS.match(c)]
+                if classes:
+                    attributes['class'] = ' '.join(classes)
+            elif name in allowed:
+                attributes[name] = value
+
+        if tag == 'a':
+            href = attributes.get('href')
+            if href is not None and not safe_url(href):
+                del attributes['href']
+            elif href and urlsplit(href).scheme.lower() in ('http', 'https'):
+                attributes['rel'] = 'noopener noreferrer'
+        elif tag == 'img':
+            src = attributes.pop('src', '').strip()
+            data_image = DATA_IMAGE.match(src)
+            if data_image:
+                try:
+                    data = base64.b64decode(data_image.group(2), validate=False)
+                except (binascii.Error, ValueError):
+                    return None
+                attributes = {**save_image(data_image.group(1), data), **attributes}
+            elif src and safe_url(src):
+                attributes = {'src': src, **attributes}
+            else:
+                return None
+            attributes.setdefault('alt', '')
+            attributes['loading'] = 'lazy'
+            attributes['decoding'] = 'async'
+        return attributes
+
+    def result(self):
+        self.close()
+        return ''.join(self.out) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+def render_body(content):
+    """Sanitized, compact HTML for an article body as readers receive it"""
+    sanitizer = BodySanitizer()
+    sanitizer.feed(content or '')
+    return sanitizer.result()
@@ -0,0 +1,113 @@
+"""Full-text article search
+
+On SQLite the plain text of each article lives in the FTS5 table
+`article_search`, keyed by article id and kept in sync by the write routes
+through index_article() / remove_article(). On Postgres the `search_vector`
+column is a generated tsvector with a GIN index, so it maintains itself and
+those calls are no-ops. Other databases fall back to LIKE matching.
+"""
+import re
+from sqlalchemy import text, or_
+from app import db
+from models import Article
+from utils import strip_tags
+import queries
+
+# bm25 weights for the title, summary and body columns
+TITLE_WEIGHT, SUMMARY_WEIGHT, BODY_WEIGHT = 10.0, 4.0, 1.0
+# Deepest result page served; further pages only cost ever larger OFFSETs
+MAX_PAGE = 50
+# NUL and other control characters are rejected by FTS5 and Postgres text parameters
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x1f\x7f]')
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+def clean_terms(terms):
+    """Search input without control characters, whitespace collapsed"""
+    return ' '.join(CONTROL_CHARACTERS.sub(' ', terms or '').split())
+
+def clamp_page(page):
+    """A requested result page number within 1..MAX_PAGE"""
+    return min(max(page or 1, 1), MAX_PAGE)
+
+def fts5_query(terms):
+    """Quote each search term so user input is never parsed as FTS5 syntax"""
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms.split())
+
+def document_values(article_id, title, summary, content):
+    return {'id': article_id, 'title': title or '', 'summary': summary or '', 'body': strip_tags(content)}
+
+def index_article(article):
+    """Write an article's searchable text into the index within the current transaction"""
+    if dialect_name() != 'sqlite':
+        return
+    remove_article(article.id)
+    db.session.execute(
+        text("INSERT INTO article_search (rowid, title, summary, body) VALUES (:id, :title, :summary, :body)"),
+        document_values(article.id, article.title, article.summary, article.content),
+    )
+
+def remove_article(article_id):
+    """Drop an article from the index within the current transaction"""
+    if dialect_name() == 'sqlite':
+        db.session.execute(text("DELETE FROM article_search WHERE rowid = :id"), {'id': article_id})
+
+def ranked_ids(terms, limit, offset):
+    """Ids of published articles matching the terms, best match first"""
+    dialect = dialect_name()
+    if dialect == 'sqlite':
+        statement = text(
+            "SELECT article.id FROM article_search JOIN article ON article.id = article_search.rowid "
+            "WHERE article_search MATCH :query AND article.published = :published "
+            f"ORDER BY bm25(article_search, {TITLE_WEIGHT}, {SUMMARY_WEIGHT}, {BODY_WEIGHT}) "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params = {'query': fts5_query(terms)}
+    elif dialect == 'postgresql':
+        statement = text(
+            "SELECT article.id FROM article, websearch_to_tsquery('english', :query) AS query "
+            "WHERE article.search_vector @@ query AND article.published = :published "
+            "ORDER BY ts_rank_cd(article.search_vector, query) DESC, article.id DESC "
+            "LIMIT :limit OFFSET :offset"
+        )
+        params = {'query': terms}
+    else:
+        pattern = f"%{terms}%"
+        return [row.id for row in db.session.query(Article.id)
+                .filter(Article.published.is_(True))
+                .filter(or_(Article.title.ilike(pattern), Article.summary.ilike(pattern),
+                            Article.content.ilike(pattern)))
+                .order_by(Article.created_at.desc(), Article.id.desc())
+                .limit(limit).offset(offset)]
+
+    params.update(published=True, limit=limit, offset=offset)
+    return [row.id for row in db.session.execute(statement, params)]
+
+def search_articles(terms, page=1, per_page=20):
+    """One page of ranked search results and whether another page follows"""
+    terms, page = clean_terms(terms), clamp_page(page)
+    if not terms:
+        return [], False
+    ids = ranked_ids(terms, per_page + 1, (page - 1) * per_page)
+    has_next = len(ids) > per_page and page < MAX_PAGE
+    ids = ids[:per_page]
+    articles = {a.id: a for a in queries.listing_query().filter(Article.id.in_(ids))} if ids else {}
+    return [articles[i] for i in ids if i in articles], has_next
+
+def rebuild_sqlite_index(conn, batch_size=500):
+    """Recreate the SQLite search index from the article table"""
+    conn.exec_driver_sql("DELETE FROM article_search")
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, title, summary, content FROM article WHERE id > :last ORDER BY id LIMIT :limit"),
+            {'last': last_id, 'limit': batch_size},
+        ).all()
+        if not rows:
+            return
+        conn.execute(
+            text("INSERT INTO article_search (rowid, title, summary, body) VALUES (:id, :title, :summary, :body)"),
+            [document_values(*row) for row in rows],
+        )
+        last_id = rows[-1].id
@@ -68,6 +68,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Article reading progress
     initReadingProgress();
 
+    // Live breaking news banner
+    initBreakingNews();
+
     // Dark mode toggle (if implemented)
     const darkModeToggle = document.querySelector('#darkModeToggle');
     if (darkModeToggle) {
@@ -105,6 +108,27 @@ function handleSearch(event) {
     });
 }
 
+// Keep the breaking news banner current without reloading the page
+function initBreakingNews() {
+    const ticker = document.getElementById('breakingNews');
+    // Only servers that hold streams open render data-stream
+    if (!ticker || !ticker.dataset.stream || !window.EventSource) {
+        return;
+    }
+    const link = ticker.querySelector('.breaking-content a');
+    const source = new EventSource(ticker.dataset.stream);
+    source.addEventListener('breaking', function(e) {
+        const banner = JSON.parse(e.data);
+        if (!banner) {
+            ticker.hidden = true;
+            return;
+        }
+        link.href = banner.url;
+        link.textContent = banner.text;
+        ticker.hidden = false;
+    });
+}
+
 // Reading progress indicator
 function initReadingProgress() {
     const article = document.querySelector('.article-content');
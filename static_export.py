@@ -0,0 +1,187 @@
+"""Pre-rendered HTML for the public pages
+
+`flask export-static` renders the homepage, every category page and every
+published article page, as an anonymous reader sees them, to files under
+STATIC_EXPORT_DIR:
+
+    index.html
+    category/<id>/index.html
+    article/<id>/index.html
+
+so a front-end server can answer those URLs from disk and pass everything
+else (query strings such as ?after=, search, login, the dashboard) to Flask.
+For nginx:
+
+    location / {
+        if ($args) { proxy_pass http://app; }
+        try_files /export$uri/index.html @app;
+    }
+
+Runs are incremental. The state file remembers when the last run started
+and a fingerprint of everything shared by all pages (navigation, breaking
+news banner, templates, asset manifest). A run re-renders the articles
+updated since then plus the listings they appear on, and everything when the
+fingerprint changed or with --full.
+
+With STATIC_EXPORT_DIR set, page_cache.purge() also queues a background job
+refreshing the files of the scopes it is given, so the write routes keep the
+export current without waiting for it: the pages of an article and its
+listings are re-rendered within moments, while a site-wide change runs a
+full export. Every file is replaced atomically, so the front-end server keeps
+answering from the previous version of a page until its new one is written.
+Site-wide changes queued while a full export is running are covered by the
+next one only.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from flask import current_app
+from app import db
+from models import Article, Category
+from jobs import task
+from database import PRIMARY_COOKIE
+
+STATE_FILE = '.export-state.json'
+BATCH_SIZE = 500
+# WSGI environ key marking the requests of an export, which bypass the page cache
+EXPORT_ENVIRON = 'sbc.static_export'
+
+def export_dir():
+    return current_app.config.get('STATIC_EXPORT_DIR')
+
+def page_file(root, path):
+    """File a URL path is exported to"""
+    return os.path.join(root, path.strip('/'), 'index.html')
+
+def write_file(path, body):
+    """Replace a file atomically, so the front-end server never reads a half-written page"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def export_pages(root, paths):
+    """Render URL paths as an anonymous reader and write them; pages that no longer exist are removed"""
+    app = current_app._get_current_object()
+    client = app.test_client()
+    # Render from the primary; a replica may not have the write that queued this refresh yet
+    client.set_cookie(PRIMARY_COOKIE, '1')
+    written = removed = 0
+    for path in paths:
+        # A fresh application context per page gives it its own g and database session, so
+        # nothing leaks in from the caller, such as the editor logged in to a write route
+        with app.app_context():
+            response = client.get(path, environ_base={EXPORT_ENVIRON: True})
+        target = page_file(root, path)
+        if response.status_code == 200:
+            write_file(target, response.get_data())
+            written += 1
+        else:
+            remove_file(target)
+            removed += 1
+    return written, removed
+
+def listing_paths():
+    return ['/'] + [f'/category/{id}' for (id,) in db.session.query(Category.id).order_by(Category.id)]
+
+def fingerprint():
+    """Hash of what every exported page shares, so a change to it triggers a full export"""
+    from queries import site_chrome
+    digest = hashlib.sha256(json.dumps(site_chrome(), sort_keys=True, default=str).encode())
+    manifest = os.path.join(current_app.config.get('ASSETS_DIST', ''), 'manifest.json')
+    if os.path.isfile(manifest):
+        with open(manifest, 'rb') as f:
+            digest.update(f.read())
+    for folder, _, files in sorted(os.walk(os.path.join(current_app.root_path, current_app.template_folder))):
+        for name in sorted(files):
+            with open(os.path.join(folder, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def load_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_state(root, started, site, full_started):
+    """Record the start of this run and of the last run that rendered every page"""
+    write_file(os.path.join(root, STATE_FILE),
+               json.dumps({'started': started.isoformat(), 'fingerprint': site,
+                           'full_started': full_started and full_started.isoformat()}).encode())
+
+def exported_article_ids(root):
+    try:
+        return {int(entry.name) for entry in os.scandir(os.path.join(root, 'article')) if entry.name.isdigit()}
+    except FileNotFoundError:
+        return set()
+
+def export(root, full=False, echo=None):
+    """Bring the export directory up to date; returns (pages written, pages removed)"""
+    started = datetime.utcnow()
+    state = load_state(root)
+    site = fingerprint()
+    published = {id for (id,) in db.session.query(Article.id).filter(Article.published.is_(True))}
+    on_disk = exported_article_ids(root)
+
+    if full or state.get('fingerprint') != site or not state.get('started'):
+        render = published
+        full_started = started
+    else:
+        since = datetime.fromisoformat(state['started'])
+        updated = {id for (id,) in db.session.query(Article.id)
+                   .filter(Article.published.is_(True), Article.updated_at >= since)}
+        # Pages missing from disk, such as those not reached by an interrupted run
+        render = updated | (published - on_disk)
+        full_started = state.get('full_started') and datetime.fromisoformat(state['full_started'])
+
+    written, removed = export_pages(root, listing_paths())
+    render = sorted(render)
+    for i in range(0, len(render), BATCH_SIZE):
+        done = export_pages(root, [f'/article/{id}' for id in render[i:i + BATCH_SIZE]])
+        written, removed = written + done[0], removed + done[1]
+        if echo:
+            echo(f"{written} pages written")
+
+    # Articles deleted or unpublished without going through the write routes
+    for id in on_disk - published:
+        shutil.rmtree(os.path.join(root, 'article', str(id)), ignore_errors=True)
+        removed += 1
+
+    save_state(root, started, site, full_started)
+    return written, removed
+
+@task('static_export.refresh')
+def refresh_scopes(scopes, purged_at=None):
+    """Re-render the exported pages of purged page-cache scopes; queued by page_cache.purge()"""
+    root = export_dir()
+    if not root:
+        return
+    scopes = set(scopes)
+    if 'site' in scopes:
+        # Every page shows the shared chrome. A full run that started after the
+        # purge already rendered every page with it.
+        full_started = load_state(root).get('full_started')
+        if purged_at and full_started and datetime.fromisoformat(full_started) >= datetime.fromisoformat(purged_at):
+            return
+        export(root, full=True)
+        return
+    paths = []
+    for scope in scopes:
+        if scope == 'listing':
+            paths.append('/')
+        elif scope.startswith(('category:', 'article:')):
+            kind, id = scope.split(':', 1)
+            paths.append(f'/{kind}/{id}')
+    export_pages(root, paths)
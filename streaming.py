@@ -0,0 +1,66 @@
+"""Streamed rendering of long public pages
+
+With STREAM_TEMPLATES on, render_page() sends a page as Jinja renders it
+instead of building the whole document first. base.html calls stream_flush()
+after the navigation and breaking news banner, so the head, stylesheets and
+nav reach the browser before the article body or listing has been rendered.
+After that, output is sent in chunks of STREAM_CHUNK_SIZE characters, so the
+worker never holds the complete page as one string.
+
+Streaming applies to responses that are not served from the page cache:
+logged-in readers, cache misses with the page cache off, and anything else
+cached_page() passes through. A page headed for the cache is still read in
+full, since the cache stores whole bodies and derives their ETag from them.
+
+Headers, including the session cookie, go out before the template runs. So
+only pages whose templates do not touch the session are streamed. Flashed
+messages are taken from the session up front, and pages with forms (CSRF
+tokens) are never streamed. An error while rendering cuts the response off
+part-way instead of producing the 500 page.
+"""
+from markupsafe import Markup
+from flask import current_app, get_flashed_messages, render_template, stream_template, stream_with_context
+
+def stream_flush():
+    """Template global ending the current chunk of a streamed page; renders nothing"""
+    return ''
+
+def html_slices(html, size=16384):
+    """Trusted HTML as consecutive Markup slices, so a long body is never copied whole while it is output"""
+    html = html or ''
+    return (Markup(html[i:i + size]) for i in range(0, len(html), size))
+
+def coalesce(pieces, size, flushes):
+    """Join Jinja's many small output pieces into chunks of about size characters
+
+    A piece of at least size characters, such as a long article body, is sent
+    as it is rather than copied into a chunk.
+    """
+    buffer, length = [], 0
+    for piece in pieces:
+        if len(piece) >= size:
+            if buffer:
+                yield ''.join(buffer)
+                buffer, length = [], 0
+            yield piece
+            continue
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size or flushes:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+            flushes.clear()
+    if buffer:
+        yield ''.join(buffer)
+
+def render_page(template_name, **context):
+    """Render a public page, streamed when STREAM_TEMPLATES is on"""
+    if not current_app.config.get('STREAM_TEMPLATES'):
+        return render_template(template_name, **context)
+    # Popping the flashes now saves the session with the headers; the template reads the cached list
+    get_flashed_messages(with_categories=True)
+    flushes = []
+    context['stream_flush'] = lambda: flushes.append(True) or ''
+    pieces = stream_template(template_name, **context)
+    chunks = coalesce(pieces, current_app.config.get('STREAM_CHUNK_SIZE', 16384), flushes)
+    return current_app.response_class(stream_with_context(chunks), mimetype='text/html')
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event
+from app import create_app, db
+from bootstrap import bootstrap
+import datagen
+
+ADMIN_EMAIL = 'admin@sbc.example'
+ADMIN_PASSWORD = 'admin-password'
+
+class StatementLog:
+    """SQL statements an engine runs while the log is entered"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.record)
+
+    def __len__(self):
+        return len(self.statements)
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an application on a fresh SQLite database with the admin user and sample categories"""
+    monkeypatch.setenv('ADMIN_EMAIL', ADMIN_EMAIL)
+    monkeypatch.setenv('ADMIN_PASSWORD', ADMIN_PASSWORD)
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    apps = []
+
+    def make_app(**config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+            'WTF_CSRF_ENABLED': False,
+            'PAGE_CACHE_ENABLED': False,
+            'JOBS_MODE': 'eager',
+            'PASSWORD_HASH_WORKERS': 0,
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+            'MEDIA_DIR': str(tmp_path / 'media'),
+            **config,
+        })
+        with app.app_context():
+            bootstrap()
+        apps.append(app)
+        return app
+
+    yield make_app
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+@pytest.fixture
+def app(make_app):
+    """Application with the default test configuration; override in a module for other settings"""
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def sql(app):
+    """Log of the statements run on the primary engine"""
+    with app.app_context():
+        return StatementLog(db.engine)
+
+@pytest.fixture
+def generate(app):
+    """Add synthetic articles to the test database"""
+    def generate(articles, seed=1):
+        with app.app_context():
+            datagen.generate(users=4, categories=3, departments=2, articles=articles,
+                             paragraphs=(1, 3), seed=seed)
+    return generate
+
+def login(client, email=ADMIN_EMAIL, password=ADMIN_PASSWORD):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302
+    return response
@@ -0,0 +1,31 @@
+import re
+from models import Article, Category
+from conftest import login
+
+def published_count(client, category_name):
+    html = client.get('/dashboard/manage-categories').get_data(as_text=True)
+    match = re.search(rf'<strong>{category_name}</strong>\s*<small[^>]*>\s*(\d+) published articles', html)
+    assert match, category_name
+    return int(match.group(1))
+
+def test_admin_counts_are_grouped_once_per_write(app, client, sql, generate):
+    login(client)
+    generate(50)
+    with app.app_context():
+        category = Category.query.order_by(Category.id).first()
+        expected = Article.query.filter_by(category_id=category.id, published=True).count()
+        category_id, category_name = category.id, category.name
+
+    assert published_count(client, category_name) == expected
+    client.get('/dashboard/manage-users')
+    with sql:
+        client.get('/dashboard/manage-categories')
+        client.get('/dashboard/manage-users')
+    assert not [statement for statement, _ in sql.statements if 'GROUP BY' in statement]
+
+    response = client.post('/dashboard/create-article', data={
+        'title': 'Counted article', 'content': '<p>Body</p>', 'category_id': category_id,
+        'department_id': 0, 'published': 'y',
+    })
+    assert response.status_code == 302
+    assert published_count(client, category_name) == expected + 1
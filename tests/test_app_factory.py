@@ -0,0 +1,23 @@
+from app import cache, instrumentation, jobs, passwords, login_limiter
+
+def test_applications_keep_their_own_extension_state(make_app):
+    first = make_app(JOBS_MODE='eager', PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', LOGIN_ACCOUNT_LIMIT=1)
+    second = make_app(JOBS_MODE='queue', PASSWORD_HASH_METHOD='pbkdf2:sha256:2000', PERF_INSTRUMENTATION=True)
+
+    with first.app_context():
+        cache.set('key', 'first')
+        login_limiter.failed('reporter@sbc.example')
+        assert jobs.mode == 'eager'
+        assert not instrumentation.enabled
+        assert passwords.hash('secret').startswith('pbkdf2:sha256:1000$')
+        assert login_limiter.attempt('127.0.0.1', 'reporter@sbc.example') > 0
+
+    with second.app_context():
+        assert cache.get('key') is None
+        assert jobs.mode == 'queue'
+        assert instrumentation.enabled
+        assert passwords.hash('secret').startswith('pbkdf2:sha256:2000$')
+        assert login_limiter.attempt('127.0.0.1', 'reporter@sbc.example') == 0
+
+    with first.app_context():
+        assert cache.get('key') == 'first'
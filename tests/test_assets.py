@@ -0,0 +1,46 @@
+import os
+import shutil
+import subprocess
+import pytest
+import assets
+
+node = pytest.mark.skipif(shutil.which('node') is None, reason='needs node to parse the minified scripts')
+
+def run_node(tmp_path, source):
+    """Output of a script run by node, which fails the test on a syntax error"""
+    path = tmp_path / 'script.js'
+    path.write_text(source)
+    result = subprocess.run(['node', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+@node
+@pytest.mark.parametrize('source', [
+    "var a = 1, b = 4, c = 2; a = b++ / c; var s = '/'; var t = 'x // y'; print([a, b, s, t]);",
+    "var a = 9, b = 3; a = b-- / 3 / 1; print([a, b, '/* not a comment */']);",
+    "var x = 10, y = 5; print(x++ /y/ 1);",
+    "var re = /[/]\\/+/g; print('a//b'.replace(re, '-'));",
+    "function f(s) { return /^\\d+$/.test(s); }\nprint([f('12'), f('1a')]);",
+    "var n = 4 / 2 / 1, r = [1, 2][0] / 2; print([n, r]);",
+    "var q = `template // ${1 + 1} /* kept */`; print(q);",
+    "var a = 1\nvar b = a\n++a\nprint([a, b]);",
+    "var i = 0; if (i) /x/.test('x'); else print(typeof /x/);",
+    "// a comment\nvar s = 'it\\'s'; /* block\n comment */ print(s + \"\\\"\");",
+])
+def test_minified_scripts_parse_and_behave_the_same(tmp_path, source):
+    prelude = 'function print(value) { console.log(JSON.stringify(value)); }\n'
+    minified = assets.minify_js(source)
+    assert run_node(tmp_path, prelude + minified) == run_node(tmp_path, prelude + source)
+
+@node
+def test_shipped_script_minifies_to_valid_javascript(tmp_path):
+    with open(os.path.join(os.path.dirname(assets.__file__), 'static', 'js', 'main.js'), encoding='utf-8') as f:
+        source = f.read()
+    path = tmp_path / 'main.min.js'
+    path.write_text(assets.minify_js(source))
+    result = subprocess.run(['node', '--check', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_minified_stylesheet_keeps_strings_and_descendant_selectors():
+    source = '/* header */\n.nav a :hover {\n  content: "a  /* b */";\n  margin : 0 ;\n}\n'
+    assert assets.minify_css(source) == '.nav a :hover{content:"a  /* b */";margin :0}'
@@ -0,0 +1,8 @@
+def test_pages_do_not_subscribe_when_streams_are_not_held(client):
+    html = client.get('/').get_data(as_text=True)
+    assert 'id="breakingNews"' in html
+    assert 'data-stream=' not in html
+
+def test_pages_subscribe_when_streams_are_held(make_app):
+    client = make_app(BREAKING_STREAM_HOLD=60).test_client()
+    assert 'data-stream="/breaking/stream"' in client.get('/').get_data(as_text=True)
@@ -0,0 +1,98 @@
+import csv
+import json
+import pytest
+from sqlalchemy import text
+from app import db
+from models import Article
+import bulk
+from conftest import ADMIN_EMAIL
+
+def record(title, content='<p>Body</p>', **fields):
+    return {'title': title, 'content': content, 'author': ADMIN_EMAIL, 'category': 'Bulk', 'published': True,
+            **fields}
+
+def run(app, *args):
+    result = app.test_cli_runner().invoke(args=['articles', *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+def indexed_titles(app):
+    """Article title per search index rowid, and per article id"""
+    with app.app_context():
+        index = dict(db.session.execute(text("SELECT rowid, title FROM article_search")).all())
+        articles = dict(db.session.execute(text("SELECT id, title FROM article")).all())
+    return index, articles
+
+BAD_RECORDS = [
+    {'title': '', 'content': '<p>No title</p>', 'author': ADMIN_EMAIL, 'category': 'Bulk'},
+    {'title': 'No content', 'content': ' ', 'author': ADMIN_EMAIL, 'category': 'Bulk'},
+    {'title': 'Bad flag', 'content': '<p>x</p>', 'author': ADMIN_EMAIL, 'category': 'Bulk', 'published': 'maybe'},
+]
+
+def append_records(path, fmt, records, malformed_line=True):
+    with bulk.open_text(str(path), 'a') as stream:
+        if fmt == 'csv':
+            csv.DictWriter(stream, fieldnames=bulk.FIELDS).writerows(records)
+        else:
+            for record in records:
+                stream.write(json.dumps(record) + '\n')
+            if malformed_line:
+                stream.write('{"title": "truncated\n')
+
+@pytest.mark.parametrize('name', ['articles.jsonl', 'articles.jsonl.gz', 'articles.csv'])
+def test_export_and_reimport(app, client, generate, tmp_path, name):
+    generate(30)
+    path = tmp_path / name
+    fmt = bulk.detect_format(name)
+    run(app, 'export', str(path))
+    append_records(path, fmt, BAD_RECORDS + [record('Zebra quartz bulletin', '<p>Imported <b>xylophone</b></p>')])
+    with app.app_context():
+        exported = Article.query.count()
+
+    output = run(app, 'import', str(path), '--chunk-size', '7', '--create-missing', '--skip-invalid')
+    skipped = len(BAD_RECORDS) + (fmt == 'jsonl')
+    assert f"Imported {exported + 1} article(s), skipped {skipped}" in output
+    with app.app_context():
+        assert Article.query.count() == 2 * exported + 1
+        imported = Article.query.filter_by(title='Zebra quartz bulletin').one()
+        assert (imported.author.email, imported.category.name, imported.published) == (ADMIN_EMAIL, 'Bulk', True)
+        imported_id = imported.id
+
+    # Each index row was written under the id of the article it describes
+    index, articles = indexed_titles(app)
+    assert index == articles
+    html = client.get('/search', query_string={'q': 'xylophone'}).get_data(as_text=True)
+    assert f'/article/{imported_id}"' in html
+
+def test_invalid_record_stops_the_import_after_committed_chunks(app, tmp_path):
+    path = tmp_path / 'articles.jsonl'
+    append_records(path, 'jsonl', [record(f'Good {i}') for i in range(3)] + BAD_RECORDS[:1] + [record('Late')],
+                   malformed_line=False)
+    result = app.test_cli_runner().invoke(args=['articles', 'import', str(path), '--chunk-size', '2',
+                                                '--create-missing'])
+    assert result.exit_code != 0
+    assert 'record 4: no title' in result.output
+    with app.app_context():
+        assert sorted(title for (title,) in db.session.query(Article.title).filter(Article.title.like('Good%'))) \
+            == ['Good 0', 'Good 1']
+        assert Article.query.filter_by(title='Late').count() == 0
+
+def test_import_leaves_reader_html_to_the_backfill(app, client):
+    with app.app_context():
+        bulk.import_articles([record('Plain', '<p onclick="steal()">Imported<script>steal()</script></p>')],
+                             create_missing=True)
+        bulk.import_articles([record('Rendered')], create_missing=True, render_bodies=True)
+        plain = Article.query.filter_by(title='Plain').one()
+        assert plain.body_html is None
+        assert Article.query.filter_by(title='Rendered').one().body_html == '<p>Body</p>'
+        plain_id = plain.id
+
+    # Until then the page renders the sanitized body itself
+    html = client.get(f'/article/{plain_id}').get_data(as_text=True)
+    assert '<p>Imported</p>' in html
+    assert 'steal()' not in html
+
+    result = app.test_cli_runner().invoke(args=['articles', 'render-bodies'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.get(Article, plain_id).body_html == '<p>Imported</p>'
@@ -0,0 +1,110 @@
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
+import pytest
+from werkzeug.http import http_date
+from app import db
+from models import Article, Category
+import datagen
+import feeds
+import page_cache
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+def parse(response, mimetype):
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    return ElementTree.fromstring(response.get_data())
+
+def published_ids(app, category_id=None):
+    """Ids of published articles, newest first, as the feeds list them"""
+    with app.app_context():
+        query = Article.query.filter_by(published=True)
+        if category_id is not None:
+            query = query.filter_by(category_id=category_id)
+        return [a.id for a in query.order_by(Article.created_at.desc(), Article.id.desc())]
+
+def article_id(url):
+    return int(url.rstrip('/').rsplit('/', 1)[1])
+
+@pytest.fixture
+def awkward_title(app, generate):
+    """Title of the newest article, changed to one that needs escaping in XML"""
+    generate(80)
+    with app.app_context():
+        article = db.session.get(Article, published_ids(app)[0])
+        article.title = 'Fish & chips <up> "20%"'
+        db.session.commit()
+        return article.title
+
+@pytest.mark.parametrize('category', [False, True])
+def test_rss_feeds_list_the_newest_articles(app, client, awkward_title, category):
+    category_id = None
+    path = '/feed.xml'
+    if category:
+        with app.app_context():
+            category_id = Category.query.order_by(Category.id).first().id
+        path = f'/category/{category_id}/feed.xml'
+    channel = parse(client.get(path), 'application/rss+xml').find('channel')
+    items = channel.findall('item')
+    assert items
+
+    assert [article_id(item.findtext('link')) for item in items] == published_ids(app, category_id)[:feeds.FEED_SIZE]
+    for item in items:
+        assert item.findtext('guid') == item.findtext('link')
+        assert parsedate_to_datetime(item.findtext('pubDate')).tzinfo is not None
+    assert parsedate_to_datetime(channel.findtext('lastBuildDate'))
+    if not category:
+        assert items[0].findtext('title') == awkward_title
+
+def test_atom_feed_lists_the_newest_articles(app, client, awkward_title):
+    feed = parse(client.get('/atom.xml'), 'application/atom+xml')
+    entries = feed.findall(f'{ATOM}entry')
+    assert [article_id(entry.findtext(f'{ATOM}id')) for entry in entries] == published_ids(app)[:feeds.FEED_SIZE]
+    assert entries[0].findtext(f'{ATOM}title') == awkward_title
+    updated = [entry.findtext(f'{ATOM}updated') for entry in entries]
+    assert all(value.endswith('Z') for value in updated)
+    assert feed.findtext(f'{ATOM}updated') == max(updated)
+
+def test_sitemap_pages_through_shards_of_ids(app, client, generate, monkeypatch):
+    monkeypatch.setattr(feeds, 'SITEMAP_SHARD_SIZE', 10)
+    monkeypatch.setattr(page_cache, 'SITEMAP_SHARD_SIZE', 10)
+    generate(45)
+    published = sorted(published_ids(app))
+
+    index = parse(client.get('/sitemap.xml'), 'application/xml')
+    locations = [entry.findtext(f'{SITEMAP}loc') for entry in index.findall(f'{SITEMAP}sitemap')]
+    assert locations[0] == 'http://localhost/sitemap-pages.xml'
+    shards = sorted({id // 10 for id in published})
+    assert locations[1:] == [f'http://localhost/sitemap-{shard}.xml' for shard in shards]
+
+    listed = []
+    for location in locations[1:]:
+        shard = parse(client.get(location), 'application/xml')
+        listed += [article_id(url.findtext(f'{SITEMAP}loc')) for url in shard.findall(f'{SITEMAP}url')]
+        assert all(url.findtext(f'{SITEMAP}lastmod') for url in shard.findall(f'{SITEMAP}url'))
+    assert listed == published
+    assert client.get(f'/sitemap-{shards[-1] + 1}.xml').status_code == 404
+
+    pages = parse(client.get('/sitemap-pages.xml'), 'application/xml')
+    with app.app_context():
+        categories = [f'http://localhost/category/{c.id}' for c in Category.query.order_by(Category.id)]
+    assert [url.findtext(f'{SITEMAP}loc') for url in pages.findall(f'{SITEMAP}url')] \
+        == ['http://localhost/'] + categories
+
+@pytest.mark.parametrize('path', ['/feed.xml', '/atom.xml', '/category/{category_id}/feed.xml', '/sitemap.xml',
+                                  '/sitemap-0.xml'])
+def test_feeds_answer_conditional_requests(make_app, path):
+    app = make_app(PAGE_CACHE_ENABLED=True)
+    with app.app_context():
+        datagen.generate(users=2, categories=1, departments=1, articles=20, paragraphs=(1, 2), seed=3)
+        newest = Article.query.filter_by(published=True).order_by(Article.updated_at.desc()).first()
+        path, updated_at = path.format(category_id=newest.category_id), newest.updated_at
+    client = app.test_client()
+
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified'] == http_date(updated_at)
+    assert client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get(path, headers={'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
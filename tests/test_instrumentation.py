@@ -0,0 +1,39 @@
+import re
+import pytest
+
+METRICS_TOKEN = 'scrape-token'
+
+@pytest.fixture
+def app(make_app):
+    return make_app(PERF_INSTRUMENTATION=True, METRICS_TOKEN=METRICS_TOKEN)
+
+def scrape(client):
+    return client.get('/dashboard/metrics', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+
+def test_server_timing_counts_queries(client, generate):
+    generate(20)
+    client.get('/')
+    timing = client.get('/').headers['Server-Timing']
+    db = re.match(r'db;dur=([\d.]+);desc="(\d+) queries"', timing)
+    total = re.search(r'total;dur=([\d.]+)', timing)
+    assert db and total
+    assert int(db.group(2)) > 0
+    assert 0 < float(db.group(1)) <= float(total.group(1))
+
+def test_metrics_summarise_endpoints(client):
+    client.get('/')
+    body = scrape(client).get_data(as_text=True)
+    assert 'sbc_request_duration_seconds_count{endpoint="main.index"} 1' in body
+    assert 'sbc_db_pool_size{engine="primary"}' in body
+
+def test_metrics_need_a_token_or_an_admin(client):
+    assert client.get('/dashboard/metrics').status_code == 403
+    assert client.get('/dashboard/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+def test_pool_gauges_without_instrumentation(make_app):
+    client = make_app(METRICS_TOKEN=METRICS_TOKEN).test_client()
+    response = scrape(client)
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'sbc_db_pool_checked_out{engine="primary"}' in body
+    assert 'sbc_request_duration_seconds' not in body
@@ -0,0 +1,132 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from models import Job
+import jobs
+
+RUNS = []
+FAILING = set()
+
+@jobs.task('test.record')
+def record(value):
+    RUNS.append(value)
+
+@jobs.task('test.flaky')
+def flaky(value):
+    RUNS.append(value)
+    if value in FAILING:
+        raise RuntimeError(f"{value} failed")
+
+@pytest.fixture(autouse=True)
+def reset_runs():
+    RUNS.clear()
+    FAILING.clear()
+
+@pytest.fixture
+def app(make_app):
+    return make_app(JOBS_MODE='queue', JOBS_RETRY_DELAY=0)
+
+@pytest.fixture
+def runner(app):
+    return app.extensions['jobs']
+
+def job(app, job_id):
+    with app.app_context():
+        return db.session.get(Job, job_id)
+
+def test_eager_mode_runs_tasks_inline(make_app):
+    app = make_app(JOBS_MODE='eager')
+    with app.app_context():
+        assert app.extensions['jobs'].enqueue('test.record', value='now') is None
+        assert Job.query.count() == 0
+    assert RUNS == ['now']
+
+def test_unknown_tasks_are_refused(app, runner):
+    with app.app_context(), pytest.raises(KeyError):
+        runner.enqueue('test.missing')
+
+def test_queued_jobs_run_once(app, runner):
+    with app.app_context():
+        job_id = runner.enqueue('test.record', value='queued')
+    assert RUNS == []
+    runner.work(burst=True)
+    runner.work(burst=True)
+    assert RUNS == ['queued']
+    assert job(app, job_id).status == 'done'
+    assert job(app, job_id).attempts == 1
+
+def test_failing_job_fails_after_max_attempts_and_can_be_retried(app, runner):
+    FAILING.add('broken')
+    with app.app_context():
+        job_id = runner.enqueue('test.flaky', max_attempts=3, value='broken')
+    runner.work(burst=True)
+    failed = job(app, job_id)
+    assert RUNS == ['broken'] * 3
+    assert (failed.status, failed.attempts) == ('failed', 3)
+    assert failed.last_error == 'RuntimeError: broken failed'
+
+    FAILING.clear()
+    with app.app_context():
+        assert runner.retry(job_id)
+        assert not runner.retry(job_id)
+        assert (db.session.get(Job, job_id).status, db.session.get(Job, job_id).attempts) == ('queued', 0)
+    runner.work(burst=True)
+    assert RUNS == ['broken'] * 4
+    assert job(app, job_id).status == 'done'
+
+def test_failed_attempts_back_off_exponentially(make_app):
+    app = make_app(JOBS_MODE='queue', JOBS_RETRY_DELAY=10)
+    runner = app.extensions['jobs']
+    FAILING.add('slow')
+    with app.app_context():
+        job_id = runner.enqueue('test.flaky', value='slow')
+    runner.work(burst=True)
+    first = job(app, job_id)
+    assert (first.status, first.attempts) == ('queued', 1)
+    assert timedelta(seconds=9) < first.run_at - datetime.utcnow() <= timedelta(seconds=10)
+    # Not due yet, so a burst leaves it alone
+    runner.work(burst=True)
+    assert RUNS == ['slow']
+
+    with app.app_context():
+        db.session.get(Job, job_id).run_at = datetime.utcnow()
+        db.session.commit()
+    runner.work(burst=True)
+    assert timedelta(seconds=19) < job(app, job_id).run_at - datetime.utcnow() <= timedelta(seconds=20)
+
+def test_jobs_of_dead_workers_are_claimed_again_after_the_timeout(app, runner):
+    now = datetime.utcnow()
+    with app.app_context():
+        for value, locked_at in (('stale', now - timedelta(seconds=runner.timeout + 1)), ('live', now)):
+            db.session.add(Job(name='test.record', payload=f'{{"value": "{value}"}}', status='running',
+                               attempts=1, locked_by='dead-worker', locked_at=locked_at, run_at=now))
+        db.session.commit()
+    runner.work(burst=True)
+    assert RUNS == ['stale']
+
+def test_prune_deletes_only_old_finished_jobs(app, runner):
+    now = datetime.utcnow()
+    with app.app_context():
+        for status, finished_at in (('done', now - timedelta(days=8)), ('done', now),
+                                    ('failed', now - timedelta(days=8))):
+            db.session.add(Job(name='test.record', status=status, finished_at=finished_at, run_at=now))
+        db.session.commit()
+        assert runner.prune(timedelta(days=7)) == 1
+        assert runner.counts() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+def test_concurrent_workers_never_run_a_job_twice(app, runner):
+    with app.app_context():
+        for i in range(51):
+            runner.enqueue('test.record', value=i)
+    workers = [threading.Thread(target=runner.work, kwargs={'worker_id': f'worker-{n}', 'burst': True})
+               for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert Counter(RUNS) == Counter(range(51))
+    with app.app_context():
+        assert runner.counts()['done'] == 51
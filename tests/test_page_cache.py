@@ -0,0 +1,77 @@
+import pytest
+from werkzeug.http import http_date
+from app import db
+from models import Article, Category
+import queries
+from conftest import login
+
+@pytest.fixture
+def app(make_app):
+    return make_app(PAGE_CACHE_ENABLED=True)
+
+@pytest.fixture
+def pages(app, generate):
+    """Paths of an article, its category, another category and the homepage"""
+    generate(20)
+    with app.app_context():
+        article = Article.query.filter_by(published=True).order_by(Article.id).first()
+        other = Category.query.filter(Category.id != article.category_id).order_by(Category.id).first()
+        return {
+            'article': f'/article/{article.id}',
+            'category': f'/category/{article.category_id}',
+            'other category': f'/category/{other.id}',
+            'home': '/',
+        }
+
+def etags(client, pages):
+    return {name: client.get(path).headers['ETag'] for name, path in pages.items()}
+
+def test_unchanged_pages_answer_304_without_queries(app, client, sql, pages):
+    first = client.get(pages['article'])
+    assert first.status_code == 200
+    with app.app_context():
+        article = db.session.get(Article, int(pages['article'].rsplit('/', 1)[1]))
+        assert first.headers['Last-Modified'] == http_date(article.updated_at)
+
+    with sql:
+        by_etag = client.get(pages['article'], headers={'If-None-Match': first.headers['ETag']})
+        by_date = client.get(pages['article'], headers={'If-Modified-Since': first.headers['Last-Modified']})
+        cached = client.get(pages['article'])
+    assert (by_etag.status_code, by_date.status_code) == (304, 304)
+    assert by_etag.get_data() == b''
+    assert cached.status_code == 200 and cached.get_data() == first.get_data()
+    assert len(sql) == 0
+
+def test_editing_an_article_changes_its_pages_only(app, client, pages):
+    reader = app.test_client()
+    before = etags(reader, pages)
+    with app.app_context():
+        article = db.session.get(Article, int(pages['article'].rsplit('/', 1)[1]))
+        form = {'title': 'Edited headline', 'content': article.content, 'summary': article.summary or '',
+                'category_id': article.category_id, 'department_id': article.department_id or 0, 'published': 'y'}
+
+    login(client)
+    assert client.post(f"/dashboard/edit-article/{pages['article'].rsplit('/', 1)[1]}", data=form).status_code == 302
+
+    after = etags(reader, pages)
+    changed = {name for name in pages if after[name] != before[name]}
+    assert changed == {'article', 'category', 'home'}
+    assert 'Edited headline' in reader.get(pages['article']).get_data(as_text=True)
+    # The old copy no longer matches
+    assert reader.get(pages['home'], headers={'If-None-Match': before['home']}).status_code == 200
+
+def test_site_purge_invalidates_every_scope(app, sql, pages):
+    reader = app.test_client()
+    before = etags(reader, pages)
+    with app.app_context():
+        category = Category.query.order_by(Category.id).first()
+        category.name = 'Renamed Desk'
+        db.session.commit()
+        queries.invalidate_site_chrome()
+
+    for name, path in pages.items():
+        with sql:
+            response = reader.get(path, headers={'If-None-Match': before[name]})
+        assert response.status_code == 200, name
+        assert len(sql) > 0, name
+        assert 'Renamed Desk' in response.get_data(as_text=True)
@@ -0,0 +1,44 @@
+import re
+import pytest
+
+NEXT_CURSOR = re.compile(r'[?&]after=([0-9-]+)')
+
+def listing_limits(statements):
+    """LIMIT bound to each statement reading article rows"""
+    return [parameters[-2] for statement, parameters in statements
+            if 'FROM article' in statement and statement.rstrip().endswith('LIMIT ? OFFSET ?')]
+
+@pytest.mark.parametrize('path', ['/', '/category/1'])
+def test_deep_pages_cost_the_same_as_the_first(app, client, sql, generate, path):
+    generate(400)
+    client.get(path)  # fills the site chrome and category count caches
+
+    counts, cursor, depth = [], None, 0
+    while True:
+        with sql:
+            response = client.get(path, query_string={'after': cursor} if cursor else None)
+        assert response.status_code == 200
+        counts.append(len(sql))
+        assert listing_limits(sql.statements) == [21]
+        match = NEXT_CURSOR.search(response.get_data(as_text=True))
+        if match is None:
+            break
+        cursor, depth = match.group(1), depth + 1
+
+    assert depth >= 5
+    # Every page but the first also shows a link back, which costs nothing extra
+    assert len(set(counts)) == 1, counts
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    '20200101000000000000',
+    '20200101000000000000-99999999999999999999999',
+    '99999999999999999999-1',
+    '20200101000000000000--1',
+])
+def test_malformed_cursors_show_the_first_page(app, client, generate, cursor):
+    generate(30)
+    first = client.get('/').get_data(as_text=True)
+    response = client.get('/', query_string={'after': cursor})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == first
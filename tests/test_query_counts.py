@@ -0,0 +1,29 @@
+from models import Article
+from conftest import login
+
+ROUTES = ('/', '/category/{category_id}', '/article/{article_id}', '/dashboard')
+
+def route_query_counts(app, client, sql):
+    """Statements run by a second, warm request to each listing route"""
+    with app.app_context():
+        article = Article.query.filter_by(published=True).order_by(Article.id).first()
+    counts = {}
+    for route in ROUTES:
+        path = route.format(category_id=article.category_id, article_id=article.id)
+        client.get(path)  # fills the site chrome and session user caches
+        with sql:
+            response = client.get(path)
+        assert response.status_code == 200, path
+        counts[route] = len(sql)
+    return counts
+
+def test_query_counts_do_not_grow_with_articles(app, client, sql, generate):
+    login(client)
+    generate(40)
+    small = route_query_counts(app, client, sql)
+    generate(160, seed=2)
+    large = route_query_counts(app, client, sql)
+
+    assert large == small
+    # Cards load their author, category and department in the listing SELECT
+    assert all(count <= 4 for count in small.values()), small
@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+from flask import g
+from app import cache
+from models import Category
+import database
+from conftest import login
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(PAGE_CACHE_ENABLED=True, DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"])
+
+def snapshot_replica(tmp_path):
+    """Copy the primary to the replica, which then lags every later write"""
+    primary, replica = sqlite3.connect(tmp_path / 'test.db'), sqlite3.connect(tmp_path / 'replica.db')
+    with replica:
+        primary.backup(replica)
+    primary.close()
+    replica.close()
+
+def test_pages_cached_after_a_write_are_read_from_the_primary(app, client, generate, tmp_path):
+    generate(5)
+    snapshot_replica(tmp_path)
+    with app.app_context():
+        category_id = Category.query.order_by(Category.id).first().id
+
+    login(client)
+    response = client.post('/dashboard/create-article', data={
+        'title': 'Fresh off the press', 'content': '<p>Body</p>', 'category_id': category_id,
+        'department_id': 0, 'published': 'y',
+    })
+    assert response.status_code == 302
+
+    reader = app.test_client()
+    assert 'Fresh off the press' in reader.get('/').get_data(as_text=True)
+    # After the window the page cached during it is still the fresh one
+    with app.app_context():
+        cache.delete(database.PRIMARY_UNTIL_KEY)
+    assert 'Fresh off the press' in reader.get('/').get_data(as_text=True)
+
+def test_replica_results_are_not_cached_while_replicas_may_be_behind(app):
+    with app.test_request_context('/'):
+        g.db_replica = app.extensions['database'].replicas[0]
+        assert not database.read_stale_replica()
+        database.read_primary_for_a_while()
+        assert database.read_stale_replica()
@@ -0,0 +1,81 @@
+import base64
+import io
+import os
+import threading
+import pytest
+from PIL import Image
+from models import Article
+from sanitize import render_body
+
+@pytest.mark.parametrize('html, body', [
+    ('<a href="javascript:alert(1)">x</a>', '<a>x</a>'),
+    ('<a href=" JavaScript:alert(1)">x</a>', '<a>x</a>'),
+    ('<a href="jav&#x61;script:alert(1)">x</a>', '<a>x</a>'),
+    ('<a href="java&#9;script:alert(1)">x</a>', '<a>x</a>'),
+    ('<a href="&#1;javascript:alert(1)">x</a>', '<a>x</a>'),
+    ('<a href="javascript&colon;alert(1)">x</a>', '<a>x</a>'),
+    ('<a href="data:text/html,hi">x</a>', '<a>x</a>'),
+    ('<a href="https://example.com/">x</a>', '<a href="https://example.com/" rel="noopener noreferrer">x</a>'),
+    ('<a href="/article/1">x</a>', '<a href="/article/1">x</a>'),
+    ('<p onclick="steal()" style="color: red">a</p>', '<p>a</p>'),
+    ('<img src="/x.png" onerror="steal()">', '<img src="/x.png" alt="" loading="lazy" decoding="async">'),
+    ('<img src="javascript:steal()">', ''),
+    ('<script>steal()</script>ok', 'ok'),
+    ('<svg><script>steal()</script><text>t</text></svg>ok', 'ok'),
+    ('<svg/onload=steal()>ok', ''),
+    ('<p><strong>a<em>b</p>c', '<p><strong>a<em>b</em></strong></p>c'),
+    ('<ul><li>x</ul>y</li>', '<ul><li>x</li></ul>y'),
+    ('<p>open', '<p>open</p>'),
+    ('<p class="ql-align-center evil">a</p>', '<p class="ql-align-center">a</p>'),
+    ('<blink>a</blink> &lt;b&gt;', 'a &lt;b&gt;'),
+])
+def test_render_body(app, html, body):
+    with app.app_context():
+        assert render_body(html) == body
+
+def png(width, height):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height), 'red').save(data, 'PNG')
+    return base64.b64encode(data.getvalue()).decode()
+
+def test_data_images_are_written_to_media_dir(app):
+    with app.app_context():
+        body = render_body(f'<img src="data:image/png;base64,{png(1000, 500)}" alt="Chart">')
+    media = set(os.listdir(app.config['MEDIA_DIR']))
+    name = next(name for name in media if '-' not in name)
+    assert media == {name, name.replace('.png', '-480.png'), name.replace('.png', '-960.png')}
+    assert body.startswith(f'<img src="/static/media/{name}" width="1000" height="500" srcset="/static/media/')
+    assert 'data:' not in body and 'alt="Chart"' in body
+
+def test_images_saved_at_once_by_several_threads_are_written_whole(app):
+    source = f'<img src="data:image/png;base64,{png(1000, 500)}">'
+    bodies = []
+
+    def save():
+        with app.app_context():
+            bodies.append(render_body(source))
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(bodies)) == 1 and 'srcset=' in bodies[0]
+    media = os.listdir(app.config['MEDIA_DIR'])
+    assert len(media) == 3
+    for name in media:
+        with Image.open(os.path.join(app.config['MEDIA_DIR'], name)) as image:
+            image.load()
+
+def test_decompression_bombs_are_served_without_variants(app, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with app.app_context():
+        body = render_body(f'<img src="data:image/png;base64,{png(1000, 500)}">')
+    assert body.startswith('<img src="/static/media/') and 'srcset=' not in body and 'width=' not in body
+    assert len(os.listdir(app.config['MEDIA_DIR'])) == 1
+
+def test_generated_articles_have_rendered_bodies(app, generate):
+    generate(5)
+    with app.app_context():
+        for article in Article.query:
+            assert article.body_html == render_body(article.content)
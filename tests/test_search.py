@@ -0,0 +1,28 @@
+import pytest
+from models import Article
+import search
+
+def test_search_finds_published_articles(app, client, generate):
+    generate(30)
+    with app.app_context():
+        article = Article.query.filter_by(published=True).order_by(Article.id).first()
+        title = article.title
+    response = client.get('/search', query_string={'q': title})
+    assert response.status_code == 200
+    assert f'/article/{article.id}"' in response.get_data(as_text=True)
+
+@pytest.mark.parametrize('query_string', [
+    {'q': 'council', 'page': '99999999999999999999'},
+    {'q': 'council', 'page': '-3'},
+    {'q': 'council\x00report'},
+    {'q': '\x00'},
+    {'q': '"council" OR NEAR(', 'page': '2'},
+])
+def test_hostile_search_input_is_not_an_error(app, client, generate, query_string):
+    generate(30)
+    assert client.get('/search', query_string=query_string).status_code == 200
+
+def test_search_input_is_cleaned():
+    assert search.clean_terms(' council\x00 report\x1f\n') == 'council report'
+    assert search.clamp_page(10 ** 20) == search.MAX_PAGE
+    assert search.clamp_page(-1) == 1
@@ -0,0 +1,45 @@
+import os
+import pytest
+from datetime import datetime
+from app import db
+from models import Article
+import page_cache
+import static_export
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(STATIC_EXPORT_DIR=str(tmp_path / 'export'))
+
+def exported_article(app, article_id):
+    with open(static_export.page_file(app.config['STATIC_EXPORT_DIR'], f'/article/{article_id}'), encoding='utf-8') as f:
+        return f.read()
+
+def test_site_purge_rerenders_article_files_in_place(app, generate):
+    generate(10)
+    root = app.config['STATIC_EXPORT_DIR']
+    with app.app_context():
+        static_export.export(root)
+        article = Article.query.filter_by(published=True).order_by(Article.id).first()
+        article_id = article.id
+        article.author.name = 'Renamed Reporter'
+        db.session.commit()
+        page_cache.purge(page_cache.SITE_SCOPE)
+
+    assert 'Renamed Reporter' in exported_article(app, article_id)
+    assert not [name for name in os.listdir(os.path.join(root, 'article', str(article_id))) if name.endswith('.tmp')]
+
+def test_site_refresh_queued_before_a_full_export_is_skipped(app, generate):
+    generate(10)
+    root = app.config['STATIC_EXPORT_DIR']
+    with app.app_context():
+        purged_at = datetime.utcnow().isoformat()
+        static_export.export(root, full=True)
+        article = Article.query.filter_by(published=True).order_by(Article.id).first()
+        article_id, name = article.id, article.author.name
+        article.author.name = 'Renamed Reporter'
+        db.session.commit()
+        static_export.refresh_scopes([page_cache.SITE_SCOPE], purged_at=purged_at)
+        assert name in exported_article(app, article_id)
+
+        static_export.refresh_scopes([page_cache.SITE_SCOPE], purged_at=datetime.utcnow().isoformat())
+        assert 'Renamed Reporter' in exported_article(app, article_id)
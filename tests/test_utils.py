@@ -0,0 +1,23 @@
+import pytest
+from utils import strip_tags, make_excerpt
+
+@pytest.mark.parametrize('html, text', [
+    ('<p>One</p><p>Two</p>', 'One Two'),
+    ('<p>In<strong>line</strong> <em>tags</em></p>', 'Inline tags'),
+    ('<h2>Heading</h2>Body<br>next line', 'Heading Body next line'),
+    ('<p>Fish &amp; chips &lt;b&gt; &#8211; done</p>', 'Fish & chips <b> – done'),
+    ('<a href="/x" title="a > b">link</a>', 'link'),
+    ('<p>a<script>bad()</script>b</p>', 'ab'),
+    ('<p>a<style>p { color: red }</style>b</p>', 'ab'),
+    ('<p>a<script>bad', 'a'),
+    ('<p>a<template>hidden</template>b</p>', 'ab'),
+    ('<p>a<!-- comment -->b</p>', 'ab'),
+    ('', ''),
+    (None, ''),
+])
+def test_strip_tags(html, text):
+    assert strip_tags(html) == text
+
+def test_make_excerpt_truncates_on_a_word():
+    excerpt = make_excerpt('<p>' + 'word ' * 100 + '</p>', length=22)
+    assert excerpt == 'word word word word...'
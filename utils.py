@@ -1,4 +1,5 @@
 from functools import wraps
+from html.parser import HTMLParser
 from flask import abort
 from flask_login import current_user
 
@@ -22,3 +23,41 @@ def truncate_text(text, length=150):
     if len(text) <= length:
         return text
     return text[:length].rsplit(' ', 1)[0] + '...'
+
+class TextExtractor(HTMLParser):
+    """Collect the readable text of an HTML fragment"""
+    SKIPPED_TAGS = {'script', 'style', 'template'}
+    BLOCK_TAGS = {'p', 'div', 'br', 'li', 'ul', 'ol', 'blockquote', 'section', 'article',
+                  'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'tr', 'td', 'th', 'figcaption'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+def strip_tags(html):
+    """Plain text of an HTML fragment with whitespace collapsed"""
+    parser = TextExtractor()
+    parser.feed(html or '')
+    parser.close()
+    return ' '.join(''.join(parser.parts).split())
+
+def make_excerpt(html, length=300):
+    """Plain-text excerpt of article HTML, computed once when the article is saved"""
+    return truncate_text(strip_tags(html), length)